@@ -1,68 +1,146 @@
+import functools
 import numpy as np
 import logging
 from rate import Rate
+from rate import compound
+from memo import Versioned
+from memo import memoize
 
 log = logging.Logger(__name__, level=logging.DEBUG)
 if not log.handlers:
     log.addHandler(logging.StreamHandler())
 
 
-def round(func):
+# number of (rate, variance, horizon, seed) market/inflation paths kept in memory
+PATH_CACHE_SIZE = 64
+
+
+@functools.lru_cache(maxsize=PATH_CACHE_SIZE)
+def cachedPath(rate: float, variance: float, nYears: int, seed: int):
     """
-    Decorator used so the the numpy array returned by functions is rounded (for prettier printing... no need to
-    display 13 decimal places).
+    Yearly and compounded returns of Rate(rate, variance) over nYears, drawn from seed.
+    Results are cached and shared, so they are returned read-only.  A given seed yields the same
+    leading years whatever the horizon, so 15-, 20- and 30-year comparisons see the same draws.
     """
-    def newFunc(*args):
-        array = func(*args)
-        return array.round()
-    return newFunc
+    ratesYearly, compounded = Rate(rate, variance, seed).cumulative(nYears)
+    ratesYearly.flags.writeable = False
+    compounded.flags.writeable = False
+    return ratesYearly, compounded
 
 
-class Abode:
+class Abode(Versioned):
 
     # default values to use
     INFLATION = Rate(rate=2.5)
     default_pmi_rate = Rate(rate=1.2)
-    STD_DEDUCTION = 24800
+    STD_DEDUCTION = 24800                   # standard deduction (married filing jointly), indexed to inflation
+    SALT_CAP = 10000                        # cap on deductible state and local taxes (not indexed)
+    MARGINAL_TAX = 22.                      # federal marginal income tax rate (percentage)
     MARKET = Rate(rate=7.0, variance=5.0)
     CAPITAL_GAIN = 0.85                     # proceeds after capital gain tax (15%)
 
-    marketReturnYearly, marketReturnCompounded = MARKET.cumulative(30)
-    inflationYearly, inflationCompounded = INFLATION.cumulative(30)
+    # seeds of the market and inflation paths shared by every Abode; drawn lazily on first use
+    # and replaced by reroll().  Set them (on Abode) for reproducible single-path results.
+    marketSeed = None
+    inflationSeed = None
+
+    # horizon in years of the shared paths; House uses its mortgage duration instead
+    nYears = 30
+
+    # number of scenarios evaluated at once; None means a single path.
+    # Set per instance (see setPaths) to evaluate a batch of scenarios as arrays.
+    nPaths = None
+    # Generator used for draws made while evaluating (e.g. appreciation); None defers to each Rate's own
+    rng = None
 
     @classmethod
     def rerollMarket(cls):
-        cls.marketReturnYearly, cls.marketReturnCompounded = cls.MARKET.cumulative(30)
+        Abode.marketSeed = np.random.SeedSequence().entropy
 
     @classmethod
     def rerollInflation(cls):
-        cls.inflationYearly, cls.inflationCompounded = cls.INFLATION.cumulative(30)
+        Abode.inflationSeed = np.random.SeedSequence().entropy
 
     @classmethod
     def reroll(cls):
         cls.rerollInflation()
         cls.rerollMarket()
 
+    def _sharedPath(self, rate: Rate, seedName: str):
+        if getattr(Abode, seedName) is None:
+            setattr(Abode, seedName, np.random.SeedSequence().entropy)
+        return cachedPath(rate.rate, rate.variance, self.nYears, getattr(Abode, seedName))
+
+    def _market(self):
+        return self.__dict__.get('_marketPath') or self._sharedPath(self.MARKET, 'marketSeed')
+
+    def _inflation(self):
+        return self.__dict__.get('_inflationPath') or self._sharedPath(self.INFLATION, 'inflationSeed')
+
+    @property
+    def marketReturnYearly(self):
+        return self._market()[0]
+
+    @property
+    def marketReturnCompounded(self):
+        return self._market()[1]
+
+    @property
+    def inflationYearly(self):
+        return self._inflation()[0]
+
+    @property
+    def inflationCompounded(self):
+        return self._inflation()[1]
+
+    def _state(self) -> tuple:
+        # shared paths are replaced (not modified) by reroll() or a new horizon, so their identity marks a change
+        return super()._state() + (id(self.marketReturnYearly), id(self.inflationYearly))
+
+    def setPaths(self, marketReturnYearly, inflationYearly, rng=None):
+        """
+        Attach market and inflation paths to this instance, overriding the shared paths.
+        Arrays may be batched, e.g. (nPaths, nYears), in which case every method returns
+        one row per scenario.  rng, if given, is used for any further draws (e.g. appreciation).
+        """
+        self._marketPath = (marketReturnYearly, compound(marketReturnYearly))
+        self._inflationPath = (inflationYearly, compound(inflationYearly))
+        self.nPaths = None if inflationYearly.ndim == 1 else inflationYearly.shape[0]
+        self.rng = rng
+
     def oop(self) -> np.array:
         raise NotImplementedError()
 
-    @round
     def opportunityCost(self,  oop=None):
-        # array to hold opportunity cost each year
-        oppCost = np.zeros(31)
-        # cumulative out-of-pocket expenses
+        """
+        Market returns forgone each year by spending out-of-pocket money instead of investing it.
+        The nth index is the return earned in year n on everything invested so far, including
+        earlier returns.  Works for any horizon (set by the length of oop) and for batched
+        (nPaths, nYears+1) expenses.
+
+        Invested wealth follows T[n] = T[n-1] * (1 + market[n-1]) + oop[n], which is solved in
+        closed form as T = G * cumsum(oop / G), with G the compounded market growth.
+        """
         if oop is None:
-            oopCum = self.oop().cumsum()
-        else:
-            oopCum = oop.cumsum()
-        for i in range(1, 31):
-            oppCost[i] = (oopCum[i-1] + oppCost[0:i].sum()) * self.marketReturnYearly[i-1]
-        return oppCost
-
-    @round
+            oop = self.oop()
+        nYears = oop.shape[-1] - 1
+        growth = compound(self.marketReturnYearly[..., :nYears])
+        invested = oop / growth
+        np.cumsum(invested, axis=-1, out=invested)
+        invested *= growth
+        # opportunity cost accumulated so far is the invested wealth beyond what was paid in
+        # (the cumulative out-of-pocket expenses); the yearly opportunity cost is its year-over-year increase
+        invested -= oop.cumsum(axis=-1)
+        return np.diff(invested, axis=-1, prepend=0)
+
+    @memoize
     def opportunityCostRealized(self):
-        return self.opportunityCost().cumsum() * self.CAPITAL_GAIN
+        realized = self.opportunityCost().cumsum(axis=-1)
+        realized *= self.CAPITAL_GAIN
+        return realized
 
-    @round
+    @memoize
     def oopInvested(self):
-        return self.oop().cumsum() + self.opportunityCostRealized()
+        invested = self.oop().cumsum(axis=-1)
+        invested += self.opportunityCostRealized()
+        return invested
@@ -0,0 +1,188 @@
+"""
+Benchmarks of the housing and rate models.
+
+Times Rate.cumulative, Mortgage.calculate_principle, Abode.opportunityCost, House.pandaize and Rent.pandaize
+for several scenario counts and horizons, with fixed seeds, and records the best time, throughput (scenarios
+per second) and peak memory of each.  Results are written as json so that runs can be compared:
+
+    python benchmark.py --output before.json
+    ... change something ...
+    python benchmark.py --output after.json --compare before.json
+
+For more than one scenario, the pandaize benchmarks evaluate the same columns on a batched House or Rent
+(see montecarlo.attachPaths), since a DataFrame holds a single path.
+"""
+import argparse
+import datetime
+import json
+import platform
+import time
+import tracemalloc
+import numpy as np
+import logging
+from abode import Abode
+from house import House
+from house import Mortgage
+from rent import Rent
+import montecarlo
+
+log = logging.Logger(__name__, level=logging.INFO)
+if not log.handlers:
+    log.addHandler(logging.StreamHandler())
+
+
+SEED = 20201
+SCENARIOS = (1, 1000, 100000)
+HORIZONS = (15, 30)
+REPEATS = 3
+SLOWDOWN = 1.2      # --compare flags benchmarks at least this much slower
+
+
+def _house(nYears) -> House:
+    return House(700000, Mortgage(3., nYears), tax=5500, down=20)
+
+
+def _paths(abode, nPaths, nYears, rng):
+    """
+    abode evaluated on seeded paths: the shared single path for one scenario, a batch otherwise.
+    Seeding changes the shared Abode seeds; measure() restores them.
+    """
+    if nPaths == 1:
+        Abode.marketSeed = Abode.inflationSeed = SEED
+        return abode
+    generator = montecarlo.defaultGenerator(abode if isinstance(abode, House) else _house(nYears))
+    return montecarlo.attachPaths(abode, generator.generate(nYears, nPaths, rng), rng)
+
+
+def rateCumulative(nPaths, nYears, rng):
+    return lambda: Abode.MARKET.cumulative(nYears, None if nPaths == 1 else nPaths, rng)
+
+
+def mortgagePrinciple(nPaths, nYears, rng):
+    rates = rng.uniform(2., 8., size=(nPaths, 1))
+    return lambda: Mortgage(rates, nYears).calculate_principle()
+
+
+def opportunityCost(nPaths, nYears, rng):
+    h = _paths(_house(nYears), nPaths, nYears, rng)
+    oop = np.array(h.oop())
+    return lambda: h.opportunityCost(oop)
+
+
+def housePandaize(nPaths, nYears, rng):
+    def run():
+        # a new House each time, so that nothing is served from its memoized schedules
+        h = _paths(_house(nYears), nPaths, nYears, rng)
+        if nPaths == 1:
+            return h.pandaize()
+        return [h.interest(), h.principal(), h.value(nYears), h.proceeds(), h.taxPayments(), h.upkeepPayments(),
+                h.insurancePayments(), h.pmi(), h.oop(), h.opportunityCostRealized(), h.oopInvested()]
+    return run
+
+
+def rentPandaize(nPaths, nYears, rng):
+    def run():
+        r = _paths(Rent(3000, nYears), nPaths, nYears, rng)
+        if nPaths == 1:
+            return r.pandaize()
+        return [r.rentPrices(), r.oop(), r.opportunityCostRealized(), r.oopInvested()]
+    return run
+
+
+BENCHMARKS = {'Rate.cumulative': rateCumulative,
+              'Mortgage.calculate_principle': mortgagePrinciple,
+              'Abode.opportunityCost': opportunityCost,
+              'House.pandaize': housePandaize,
+              'Rent.pandaize': rentPandaize,
+              }
+
+
+def measure(name, nPaths, nYears, repeats=REPEATS) -> dict:
+    """
+    Best-of-repeats wall time and peak traced memory of one benchmark.
+    Tracing slows everything down, so the timed repeats are untraced and memory is measured in one extra run.
+    """
+    seeds = Abode.marketSeed, Abode.inflationSeed
+    try:
+        rng = np.random.default_rng(SEED)
+        run = BENCHMARKS[name](nPaths, nYears, rng)
+        times = []
+        for _ in range(repeats):
+            t0 = time.perf_counter()
+            run()
+            times.append(time.perf_counter() - t0)
+        tracemalloc.start()
+        try:
+            run()
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+    finally:
+        Abode.marketSeed, Abode.inflationSeed = seeds
+    best = min(times)
+    return {'benchmark': name,
+            'nPaths': nPaths,
+            'nYears': nYears,
+            'seconds': best,
+            'throughput': nPaths / best,
+            'peakMB': peak / 1e6,
+            }
+
+
+def run(benchmarks=tuple(BENCHMARKS), scenarios=SCENARIOS, horizons=HORIZONS, repeats=REPEATS) -> dict:
+    results = []
+    for name in benchmarks:
+        for nYears in horizons:
+            for nPaths in scenarios:
+                result = measure(name, nPaths, nYears, repeats)
+                log.info("{benchmark:30s} {nPaths:>7d} x {nYears:2d}y  {seconds:9.5f} s  "
+                         "{throughput:12.0f} /s  {peakMB:8.1f} MB".format(**result))
+                results.append(result)
+    return {'date': datetime.datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'seed': SEED,
+            'repeats': repeats,
+            'results': results,
+            }
+
+
+def compare(old: dict, new: dict, slowdown=SLOWDOWN) -> list:
+    """
+    Return (benchmark, nPaths, nYears, ratio) for every benchmark at least slowdown times slower in new.
+    """
+    key = lambda r: (r['benchmark'], r['nPaths'], r['nYears'])
+    before = {key(r): r['seconds'] for r in old['results']}
+    slower = []
+    for r in new['results']:
+        if key(r) in before and r['seconds'] >= slowdown * before[key(r)]:
+            slower.append(key(r) + (r['seconds'] / before[key(r)],))
+    return slower
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().split('\n')[0])
+    parser.add_argument('--output', default='benchmark.json', help='json file to write results to')
+    parser.add_argument('--compare', help='earlier results to compare against')
+    parser.add_argument('--benchmarks', nargs='+', default=list(BENCHMARKS), choices=list(BENCHMARKS))
+    parser.add_argument('--scenarios', nargs='+', type=int, default=list(SCENARIOS))
+    parser.add_argument('--horizons', nargs='+', type=int, default=list(HORIZONS))
+    parser.add_argument('--repeats', type=int, default=REPEATS)
+    args = parser.parse_args()
+
+    results = run(args.benchmarks, args.scenarios, args.horizons, args.repeats)
+    with open(args.output, mode='w') as file:
+        json.dump(results, file, indent=2)
+
+    if args.compare:
+        with open(args.compare, mode='r') as file:
+            old = json.load(file)
+        slower = compare(old, results)
+        for name, nPaths, nYears, ratio in slower:
+            log.warning("SLOWER: {0} {1} x {2}y is {3:.2f}x the earlier time".format(name, nPaths, nYears, ratio))
+        if slower:
+            raise SystemExit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,34 @@
+"""
+Vectorized bisection: find a root of many functions at once, one per element of an array of brackets.
+
+Used by the break-even solver (breakeven.solveBatch) and by the internal rate of return (investment.xirr),
+where each function evaluation is one batched computation over every row.
+"""
+import numpy as np
+
+
+def solve(function, low: np.array, high: np.array, tolerance: float, maxEvaluations: int) -> tuple:
+    """
+    Bisect every bracket [low, high] at once until all are narrower than tolerance, or maxEvaluations calls of
+    function (array -> array of the same shape) have been made, keeping in each the half across which function
+    changes sign.
+    :return: (low, high, valid): the final brackets, and where function strictly changes sign over the initial
+             bracket or is zero at exactly one of its ends (elsewhere the brackets are meaningless; in particular
+             where function is zero at both ends, e.g. everywhere)
+    """
+    low = np.asarray(low, dtype=float)
+    high = np.asarray(high, dtype=float)
+    fLow = function(low)
+    fHigh = function(high)
+    valid = ((np.sign(fLow) * np.sign(fHigh) < 0) | ((fLow == 0) != (fHigh == 0))) & \
+        np.isfinite(fLow) & np.isfinite(fHigh)
+    for _ in range(maxEvaluations - 2):
+        if np.all(high - low <= tolerance):
+            break
+        middle = (low + high) / 2
+        fMiddle = function(middle)
+        sameSide = np.sign(fMiddle) == np.sign(fLow)
+        low = np.where(sameSide, middle, low)
+        fLow = np.where(sameSide, fMiddle, fLow)
+        high = np.where(sameSide, high, middle)
+    return low, high, valid
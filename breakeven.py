@@ -0,0 +1,126 @@
+"""
+Break-even solver for renting versus buying.
+
+For every Monte Carlo path and every year of the horizon, find the value of one input (the monthly rent,
+the house price or the mortgage rate) at which renting and buying come out even, i.e. at which the renter's
+OOP_Invest equals the buyer's NetLoss if the house is sold that year.
+
+Each (path, year) pair becomes one row of a batched scenario, with the solved-for input as a column vector,
+so every step of the bisection is a single vectorized House/Rent evaluation over all rows.
+"""
+import copy
+import numpy as np
+import pandas as pd
+import logging
+from house import House
+from rent import Rent
+from rate import spawn
+import montecarlo
+import bisection
+
+log = logging.Logger(__name__, level=logging.DEBUG)
+if not log.handlers:
+    log.addHandler(logging.StreamHandler())
+
+
+PARAMETERS = ('rentMonthly', 'price', 'rate')
+# default width of the final bracket, in the units of each parameter: dollars, dollars, percentage points
+TOLERANCE = {'rentMonthly': 1., 'price': 1., 'rate': 0.01}
+BATCH_SIZE = 1000       # paths per batch; each path is evaluated once per year of the horizon
+
+
+def defaultBracket(parameter: str, house: House) -> tuple:
+    """
+    Interval searched for the break-even value when none is given.
+    """
+    if parameter == 'rentMonthly':
+        return 0., house.price / 50
+    if parameter == 'price':
+        return 0., house.price * 10
+    if parameter == 'rate':
+        return 0., 25.
+    raise ValueError("breakeven: parameter must be one of {0}; got {1}".format(PARAMETERS, parameter))
+
+
+def _withParameter(house: House, rent: Rent, parameter: str, values) -> tuple:
+    """
+    Shallow copies of house and rent with parameter replaced by values (a column vector, one row per scenario).
+    """
+    house = copy.copy(house)
+    rent = copy.copy(rent)
+    if parameter == 'rentMonthly':
+        rent.rentMonthly = values
+    elif parameter == 'price':
+        house.price = values
+    elif parameter == 'rate':
+        # replace rather than modify the mortgage, which the original house still holds;
+        # a copy keeps the terms of an adjustable or refinanced mortgage
+        house.mortgage = house.mortgage.withRate(values)
+    return house, rent
+
+
+def solveBatch(house: House, rent: Rent, parameter: str, nPaths: int, rng=None, generator=None,
+               bracket=None, tolerance=None, maxEvaluations=40) -> np.array:
+    """
+    Return an (nPaths, nYears+1) array of break-even values of parameter, NaN where the bracket holds no
+    break-even (always the case for year 0, when nothing has been paid in rent yet).
+    Bisection stops when every bracket is narrower than tolerance (by default, TOLERANCE[parameter]),
+    or after maxEvaluations evaluations.
+    """
+    if parameter not in PARAMETERS:
+        raise ValueError("breakeven: parameter must be one of {0}; got {1}".format(PARAMETERS, parameter))
+    tolerance = TOLERANCE[parameter] if tolerance is None else tolerance
+    rng = np.random.default_rng(rng)
+    generator = generator if generator else montecarlo.defaultGenerator(house)
+    nYears = house.nYears
+    paths = generator.generate(nYears, nPaths, rng)
+
+    # one row per (path, year sold), years 1..nYears
+    years = np.tile(np.arange(1, nYears + 1), nPaths)
+    rows = np.arange(len(years))
+    paths = {name: np.repeat(path, nYears, axis=0) for name, path in paths.items()}
+
+    def difference(values):
+        h, r = _withParameter(house, rent, parameter, values[:, None])
+        h = montecarlo.attachPaths(h, paths, rng)
+        r = montecarlo.attachPaths(r, paths, rng)
+        netLoss = h.oopInvested() - h.proceeds()
+        return (r.oopInvested() - netLoss)[rows, years]
+
+    low, high = bracket if bracket else defaultBracket(parameter, house)
+    low, high, valid = bisection.solve(difference, np.full(len(years), float(low)), np.full(len(years), float(high)),
+                                       tolerance, maxEvaluations)
+    if np.any(high - low > tolerance):
+        log.warning("breakeven: evaluation budget of {0} reached before tolerance {1}".format(
+            maxEvaluations, tolerance))
+
+    solved = np.full((nPaths, nYears + 1), np.nan)
+    solved[:, 1:] = np.where(valid, (low + high) / 2, np.nan).reshape(nPaths, nYears)
+    return solved
+
+
+def solve(house: House, rent: Rent, parameter: str, nPaths: int, seed=None, batchSize: int = BATCH_SIZE,
+          **kwargs) -> np.array:
+    """
+    Break-even values of parameter ('rentMonthly', 'price' or 'rate') for nPaths scenarios, as an
+    (nPaths, nYears+1) array.  Keyword arguments (generator, bracket, tolerance, maxEvaluations)
+    are passed to solveBatch.
+    """
+    if parameter not in PARAMETERS:
+        raise ValueError("breakeven: parameter must be one of {0}; got {1}".format(PARAMETERS, parameter))
+    sizes = montecarlo.batchSizes(nPaths, batchSize)
+    return np.concatenate([solveBatch(house, rent, parameter, n, rng, **kwargs)
+                           for n, rng in zip(sizes, spawn(seed, len(sizes)))])
+
+
+def breakEven(house: House, rent: Rent, parameter: str, nPaths: int, percentiles=montecarlo.PERCENTILES,
+              **kwargs) -> pd.DataFrame:
+    """
+    Percentile bands, year by year, of the break-even value of parameter.
+    Paths with no break-even inside the bracket are left out.
+    """
+    solved = solve(house, rent, parameter, nPaths, **kwargs)
+    data = {p: band for p, band in zip(percentiles, np.nanpercentile(solved, percentiles, axis=0))}
+    df = pd.DataFrame(data=data)
+    df.index.name = 'Year'
+    return df
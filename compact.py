@@ -0,0 +1,120 @@
+"""
+Compact storage for very large House-vs-Rent simulations.
+
+montecarlo.evaluate holds a dozen float64 (nPaths, nYears+1) schedules per batch -- interest, principal, value,
+proceeds, tax, upkeep, insurance, PMI, OOP, opportunity cost, ... -- which for a million paths would take
+several GB.  Everything in those schedules follows from a handful of yearly paths (market, inflation,
+appreciation and, for a VariableMortgage, mortgage rates), so CompactSimulation stores only those, as one
+preallocated float32 struct of arrays, and computes any column on demand, a chunk of rows at a time, through
+the usual House and Rent methods.  A million 30-year paths then take about 360 MB, plus 124 MB per float32
+column requested.
+
+Float32 keeps about 7 significant digits of each yearly rate, which moves results by a few dollars out of
+millions; pass dtype=np.float64 where that matters.  Scenarios are drawn with the same batches and random
+streams as montecarlo.simulate.
+"""
+import numpy as np
+import pandas as pd
+import logging
+from house import House
+from rent import Rent
+from rate import spawn
+from scenario import ScenarioGenerator
+import montecarlo
+
+log = logging.Logger(__name__, level=logging.DEBUG)
+if not log.handlers:
+    log.addHandler(logging.StreamHandler())
+
+
+CHUNK_SIZE = montecarlo.BATCH_SIZE      # rows evaluated at once when computing a column
+
+# column name -> function of the batched (House, Rent) computing it; see House.pandaize and Rent.pandaize
+COLUMNS = {'Interest': lambda h, r: h.interest(),
+           'Principal': lambda h, r: h.principal(),
+           'Value': lambda h, r: h.value(h.mortgage.duration),
+           'Proceeds': lambda h, r: h.proceeds(),
+           'Tax': lambda h, r: h.taxPayments(),
+           'Upkeep': lambda h, r: h.upkeepPayments(),
+           'Insurance': lambda h, r: h.insurancePayments(),
+           'PMI': lambda h, r: h.pmi(),
+           'Deduction': lambda h, r: h.mortgageDeduction(),
+           'OOP': lambda h, r: h.oop(),
+           'OppCostR': lambda h, r: h.opportunityCostRealized(),
+           'OOP_Invest': lambda h, r: h.oopInvested(),
+           'NetLoss': lambda h, r: h.oopInvested() - h.proceeds(),
+           'Rent': lambda h, r: r.oop(),
+           'Rent_OppCostR': lambda h, r: r.opportunityCostRealized(),
+           'Rent_OOP_Invest': lambda h, r: r.oopInvested(),
+           }
+
+
+class CompactSimulation:
+    """
+    nPaths scenarios of house against rent, stored as their yearly paths only.
+    paths is a single (nFactors, nPaths, nYears) array; factors are the names of its first axis.
+    """
+    def __init__(self, house: House, rent: Rent, nPaths: int, seed=None, batchSize: int = montecarlo.BATCH_SIZE,
+                 generator: ScenarioGenerator = None, dtype=np.float32):
+        generator = generator if generator else montecarlo.defaultGenerator(house)
+        self.house = house
+        self.rent = rent
+        self.nPaths = nPaths
+        self.nYears = house.nYears
+        # appreciation is always stored, so that every column of a scenario comes from the same path
+        self.factors = tuple(generator.names) + (() if 'appreciation' in generator.names else ('appreciation',))
+        self.paths = np.empty((len(self.factors), nPaths, self.nYears), dtype=dtype)
+
+        sizes = montecarlo.batchSizes(nPaths, batchSize)
+        start = 0
+        for n, rng in zip(sizes, spawn(seed, len(sizes))):
+            batch = generator.generate(self.nYears, n, rng)
+            if 'appreciation' not in batch:
+                # the draws House.appreciationCumulative would make in montecarlo.evaluate
+                batch['appreciation'] = house.appreciation.generate(self.nYears, n, rng)
+            for i, factor in enumerate(self.factors):
+                self.paths[i, start:start + n] = batch[factor]
+            start += n
+
+    def attach(self, rows=slice(None)) -> tuple:
+        """
+        Batched (House, Rent) evaluating the scenarios in rows, at full precision.
+        A single row (an int) gives single-path objects, as used by pandaize.
+        """
+        paths = {factor: self.paths[i, rows].astype(np.float64) for i, factor in enumerate(self.factors)}
+        return montecarlo.attachPaths(self.house, paths), montecarlo.attachPaths(self.rent, paths)
+
+    def columns(self, names, dtype=None) -> dict:
+        """
+        Compute the given columns (see COLUMNS) for every scenario, CHUNK_SIZE rows at a time, each into an
+        (nPaths, nYears+1) array of dtype (by default, that of the stored paths).  Returns name -> array.
+        """
+        for name in names:
+            if name not in COLUMNS:
+                raise ValueError("CompactSimulation: column must be one of {0}; got {1}".format(
+                    tuple(COLUMNS), name))
+        dtype = dtype if dtype else self.paths.dtype
+        outputs = {name: np.empty((self.nPaths, self.nYears + 1), dtype=dtype) for name in names}
+        for start in range(0, self.nPaths, CHUNK_SIZE):
+            rows = slice(start, min(start + CHUNK_SIZE, self.nPaths))
+            # one House and Rent per chunk, so that columns share their memoized schedules
+            h, r = self.attach(rows)
+            for name, output in outputs.items():
+                output[rows] = COLUMNS[name](h, r)
+        return outputs
+
+    def column(self, name: str, dtype=None) -> np.array:
+        return self.columns([name], dtype)[name]
+
+    def summarize(self, names=montecarlo.RESULTS, percentiles=montecarlo.PERCENTILES) -> pd.DataFrame:
+        """
+        Percentile bands per year of the given columns, as montecarlo.simulate returns them.
+        """
+        return montecarlo.summarize(self.columns(names), percentiles)
+
+    def pandaize(self, path: int) -> pd.DataFrame:
+        """
+        House.pandaize of a single scenario.
+        """
+        h, _ = self.attach(path)
+        return h.pandaize()
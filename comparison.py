@@ -0,0 +1,114 @@
+"""
+Compare many House (and Rent) configurations on the same Monte Carlo scenarios.
+
+Rather than calling pandaize() on each house and eyeballing the tables, evaluate every configuration against
+common random numbers: each batch of scenarios owns one random stream, and every configuration draws its
+paths from its own copy of that stream.  Configurations sharing market and inflation Rates therefore see the
+very same market and inflation paths (and houses with different appreciation Rates see the same shocks, scaled
+to their own Rate), so differences between them reflect the houses, not the luck of the draw, and far fewer
+paths are needed to rank them.  Batches run across a pool of worker processes.
+
+The net position of buying is the renter's OOP_Invest minus the buyer's NetLoss: positive when buying
+(and selling that year) comes out ahead.  Its break-even year is the first year it is positive.
+"""
+import os
+import copy
+import time
+import numpy as np
+import pandas as pd
+import logging
+from house import House
+from rent import Rent
+from rate import spawn
+from scenario import ScenarioGenerator
+import montecarlo
+import parallel
+
+log = logging.Logger(__name__, level=logging.INFO)
+if not log.handlers:
+    log.addHandler(logging.StreamHandler())
+
+
+def _configurations(configurations: dict, rent: Rent) -> dict:
+    """
+    Normalize name -> House or (House, Rent) into name -> (House, Rent).
+    """
+    normalized = {}
+    for name, configuration in configurations.items():
+        if isinstance(configuration, House):
+            if rent is None:
+                raise ValueError("comparison: {0} has no Rent and no default rent was given".format(name))
+            configuration = (configuration, rent)
+        normalized[name] = configuration
+    return normalized
+
+
+def evaluateBatch(configurations: dict, generators: dict, year: int, nPaths: int, rng) -> dict:
+    """
+    Evaluate every configuration (name -> (House, Rent)) on nPaths scenarios drawn from a copy of rng.
+    Returns name -> (net position in year, break-even year), each an (nPaths,) array; the break-even year is
+    NaN for scenarios that never break even.
+    """
+    nYears = max(house.nYears for house, _ in configurations.values())
+    outcomes = {}
+    for name, (house, rent) in configurations.items():
+        stream = copy.deepcopy(rng)     # every configuration starts from the same state: common random numbers
+        # draw over the longest horizon so that paths agree year by year across horizons, then truncate
+        paths = generators[name].generate(nYears, nPaths, stream)
+        paths = {factor: path[:, :house.nYears] for factor, path in paths.items()}
+        results = montecarlo.evaluatePaths(house, rent, paths, stream)
+        position = results['Rent_OOP_Invest'] - results['NetLoss']
+        ahead = position[:, 1:] > 0
+        breakEven = np.where(ahead.any(axis=1), ahead.argmax(axis=1) + 1., np.nan)
+        outcomes[name] = (position[:, year], breakEven)
+    return outcomes
+
+
+def _runBatch(state: dict, nPaths: int, rng) -> dict:
+    return evaluateBatch(state['configurations'], state['generators'], state['year'], nPaths, rng)
+
+
+def compare(configurations: dict, nPaths: int, rent: Rent = None, year: int = None,
+            percentiles=montecarlo.PERCENTILES, seed=None, batchSize: int = montecarlo.BATCH_SIZE,
+            nWorkers: int = None, generator: ScenarioGenerator = None) -> pd.DataFrame:
+    """
+    Rank configurations (name -> House, or (House, Rent)) by their median net position in year, over nPaths
+    common scenarios.  Houses given alone are compared against rent.  year defaults to the shortest horizon.
+    Paths come from generator, or from each house's montecarlo.defaultGenerator.
+    Returns a DataFrame indexed by name, best first, with the percentiles of the net position (P10, P50, P90),
+    the median break-even year among scenarios that break even, and the share of scenarios that do.
+    :param nWorkers: number of worker processes; defaults to the number of cores, 1 runs in this process
+    """
+    configurations = _configurations(configurations, rent)
+    generators = {name: generator if generator else montecarlo.defaultGenerator(house)
+                  for name, (house, _) in configurations.items()}
+    horizon = min(house.nYears for house, _ in configurations.values())
+    year = horizon if year is None else year
+    if not 0 <= year <= horizon:
+        raise ValueError("comparison: year must be within 0..{0}; got {1}".format(horizon, year))
+
+    nWorkers = nWorkers if nWorkers else os.cpu_count()
+    sizes = montecarlo.batchSizes(nPaths, batchSize)
+    rngs = spawn(seed, len(sizes))
+    t0 = time.perf_counter()
+    state = {'configurations': configurations, 'generators': generators, 'year': year}
+    batches = parallel.run(_runBatch, state, sizes, rngs, nWorkers=nWorkers)
+    elapsed = time.perf_counter() - t0
+    log.info("{0} configurations x {1} scenarios on {2} workers in {3:.2f} s".format(
+        len(configurations), nPaths, nWorkers, elapsed))
+
+    rows = {}
+    medians = {}
+    for name in configurations:
+        position = np.concatenate([b[name][0] for b in batches])
+        breakEven = np.concatenate([b[name][1] for b in batches])
+        row = {'P{0}'.format(p): band.round() for p, band in zip(percentiles, np.percentile(position, percentiles))}
+        evens = ~np.isnan(breakEven)
+        row['BreakEvenYear'] = np.median(breakEven[evens]) if evens.any() else np.nan
+        row['BreakEvenShare'] = evens.mean()
+        rows[name] = row
+        medians[name] = np.median(position)
+    ranked = sorted(rows, key=lambda name: -medians[name])
+    df = pd.DataFrame.from_dict({name: rows[name] for name in ranked}, orient='index')
+    df.index.name = 'Name'
+    return df
@@ -0,0 +1,101 @@
+"""
+Stream batched House-vs-Rent simulation results to disk.
+
+Rather than building one DataFrame per scenario and writing it to csv (House.writeCsv), write every result of
+montecarlo.evaluate into its own memory-mapped .npy file of shape (nPaths, nYears+1), one batch of scenarios at
+a time, so memory use does not grow with the number of scenarios.  The parameters of the House, Rent and
+scenario generator, the seed and the batch size are written alongside as metadata.json.
+
+Layout of an export directory:
+    metadata.json
+    NetLoss.npy, OOP_Invest.npy, Proceeds.npy, Rent_OOP_Invest.npy
+"""
+import os
+import json
+import numpy as np
+import logging
+from house import House
+from rent import Rent
+from memo import Versioned
+from scenario import ScenarioGenerator
+from rate import spawn
+import montecarlo
+
+log = logging.Logger(__name__, level=logging.DEBUG)
+if not log.handlers:
+    log.addHandler(logging.StreamHandler())
+
+
+METADATA = 'metadata.json'
+
+
+def describe(obj):
+    """
+    JSON-friendly description of the parameters of a House, Rent, Mortgage, Rate or ScenarioGenerator:
+    its public attributes, recursively, plus private ones holding parameters (e.g. Mortgage._rate, listed
+    as 'rate').  Random generators, caches and attached paths are left out.
+    """
+    if isinstance(obj, (Versioned, ScenarioGenerator)):
+        description = {'class': type(obj).__name__}
+        for name, value in vars(obj).items():
+            if name.startswith('_'):
+                if isinstance(value, Versioned):
+                    description[name.lstrip('_')] = describe(value)
+            elif not isinstance(value, np.random.Generator):
+                description[name] = describe(value)
+        return description
+    if isinstance(obj, dict):
+        return {str(k): describe(v) for k, v in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return [describe(v) for v in obj]
+    if isinstance(obj, (np.ndarray, np.generic)):
+        return obj.tolist()
+    return obj
+
+
+def export(house: House, rent: Rent, nPaths: int, directory: str, seed=None,
+           batchSize: int = montecarlo.BATCH_SIZE, generator: ScenarioGenerator = None, dtype=np.float32):
+    """
+    Simulate nPaths scenarios of house against rent, batch by batch, writing the results into directory.
+    The default float32 holds whole dollars exactly up to about $16M while halving the file size;
+    pass dtype=np.float64 for full precision.
+    """
+    os.makedirs(directory, exist_ok=True)
+    generator = generator if generator else montecarlo.defaultGenerator(house)
+    metadata = {'nPaths': nPaths,
+                'nYears': house.nYears,
+                'seed': seed if isinstance(seed, (int, type(None))) else str(seed),
+                'batchSize': batchSize,
+                'dtype': np.dtype(dtype).name,
+                'house': describe(house),
+                'rent': describe(rent),
+                'generator': describe(generator),
+                }
+    with open(os.path.join(directory, METADATA), mode='w') as file:
+        json.dump(metadata, file, indent=2)
+
+    shape = (nPaths, house.nYears + 1)
+    outputs = {name: np.lib.format.open_memmap(os.path.join(directory, name + '.npy'),
+                                               mode='w+', dtype=dtype, shape=shape)
+               for name in montecarlo.RESULTS}
+    sizes = montecarlo.batchSizes(nPaths, batchSize)
+    start = 0
+    for n, rng in zip(sizes, spawn(seed, len(sizes))):
+        batch = montecarlo.evaluate(house, rent, n, rng, generator)
+        for name, output in outputs.items():
+            output[start:start + n] = batch[name]
+        start += n
+    for output in outputs.values():
+        output.flush()
+
+
+def load(directory: str) -> tuple:
+    """
+    Open an export directory.  Returns (metadata, results), results being a dict of read-only,
+    memory-mapped (nPaths, nYears+1) arrays, so only the parts that are used are read from disk.
+    """
+    with open(os.path.join(directory, METADATA), mode='r') as file:
+        metadata = json.load(file)
+    results = {name: np.load(os.path.join(directory, name + '.npy'), mmap_mode='r')
+               for name in montecarlo.RESULTS}
+    return metadata, results
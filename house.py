@@ -1,39 +1,125 @@
+import copy
 import numpy as np
 import pandas as pd
 import logging
 from rate import Rate
+from rate import compound
 from abode import Abode
-from abode import round
+from memo import Versioned
+from memo import memoize
 
 log = logging.Logger(__name__, level=logging.WARNING)
 if not log.handlers:
     log.addHandler(logging.StreamHandler())
 
 
-class Mortgage:
+# payment periods per year accepted by amortize() and Mortgage
+YEARLY = 1
+MONTHLY = 12
+BIWEEKLY = 26
+
+
+def amortize(rate, duration, periodsPerYear=YEARLY) -> dict:
+    """
+    Closed-form amortization of a NORMALIZED loan (principle of 1).
+    rate (percentage per year) and duration (years) may be arrays; they broadcast against the period axis,
+    which is the last axis, so pass e.g. rates[:, None, None] and durations[None, :, None] to evaluate every
+    combination of rate and duration.
+    Loans shorter than the longest duration are zero-padded after they are paid off.
+    Returns a dict of arrays, one entry per period (0th index being the time of purchase):
+    'payment'            -- fixed payment per period
+    'balance'            -- principle remaining after n payments
+    'interest'           -- interest paid in period n
+    'principal'          -- principle paid down in period n
+    'cumulativeInterest' -- interest paid through period n
+    """
+    decimal = np.asarray(rate, dtype=float) / 100 / periodsPerYear    # rate per period
+    nPayments = np.asarray(duration) * periodsPerYear
+    periods = np.arange(int(np.max(nPayments)) + 1)
+
+    total = (1 + decimal) ** nPayments
+    with np.errstate(divide='ignore', invalid='ignore'):
+        # balance after n payments is ((1+r)^N - (1+r)^n) / ((1+r)^N - 1); linear paydown if r is 0
+        balance = np.where(decimal == 0,
+                           1 - periods / nPayments,
+                           (total - (1 + decimal) ** periods) / (total - 1))
+        payment = np.where(decimal == 0,
+                           1 / nPayments,
+                           decimal * total / (total - 1))
+    balance = np.where(periods < nPayments, balance, 0.)    # paid off exactly at (and after) maturity
+
+    interest = np.zeros(balance.shape)
+    interest[..., 1:] = decimal * balance[..., :-1]
+    principal = np.zeros(balance.shape)
+    principal[..., 1:] = balance[..., :-1] - balance[..., 1:]
+    return {'payment': payment,
+            'balance': balance,
+            'interest': interest,
+            'principal': principal,
+            'cumulativeInterest': interest.cumsum(axis=-1),
+            }
+
+
+def amortizeVariable(ratePath, refinanceCost=None) -> dict:
+    """
+    Yearly amortization of a NORMALIZED loan whose rate changes from year to year.
+    ratePath (percentage) holds the rate of each year along the last axis, whose length is the duration;
+    leading axes are scenarios.  Each year the payment is the level payment that would pay off the remaining
+    balance over the remaining term at that year's rate, which reproduces the fixed-rate schedule when the rate
+    does not change.  The balance is then a cumulative product of one-year factors, with no loop over years.
+    refinanceCost, if given, is the fraction of the balance added to the loan at the end of each year
+    (closing costs of a refinance rolled into the new loan).
+    Returns a dict like amortize(), with 'payment' holding the payment made each year.
+    """
+    decimal = np.asarray(ratePath, dtype=float) / 100
+    duration = decimal.shape[-1]
+    remaining = duration - np.arange(duration)          # years left at the start of each year
+    total = (1 + decimal) ** remaining
+    with np.errstate(divide='ignore', invalid='ignore'):
+        # fraction of the balance left after one payment, and the payment as a fraction of the balance
+        factor = np.where(decimal == 0, 1 - 1 / remaining, (total - (1 + decimal)) / (total - 1))
+        annuity = np.where(decimal == 0, 1 / remaining, decimal * total / (total - 1))
+    if refinanceCost is not None:
+        factor = factor * (1 + refinanceCost)
+
+    balance = np.ones(factor.shape[:-1] + (duration + 1,))
+    np.cumprod(factor, axis=-1, out=balance[..., 1:])
+    payment = np.zeros(balance.shape)
+    payment[..., 1:] = balance[..., :-1] * annuity
+    interest = np.zeros(balance.shape)
+    interest[..., 1:] = balance[..., :-1] * decimal
+    return {'payment': payment,
+            'balance': balance,
+            'interest': interest,
+            'principal': payment - interest,
+            'cumulativeInterest': interest.cumsum(axis=-1),
+            }
+
+
+class Mortgage(Versioned):
     """
     NORMALIZED mortgage, e.g. the principle is 1.
     """
-    def __init__(self, rate: float, duration: int):
+    def __init__(self, rate: float, duration: int, periodsPerYear: int = YEARLY):
         """
         Accept rate as a float and convert to Rate class.
         Mortgages have no variance, so we se this to 0 in the
         constructed Rate instance.
+        periodsPerYear sets how often payments are made (YEARLY, MONTHLY, BIWEEKLY); schedules
+        below are still reported year by year.
         """
         self._rate = Rate(rate)  # self._rate will be Rate class
         # but self.rate is a @property defined below
         # public facing method for getting rate quickly
         self.duration = duration
+        self.periodsPerYear = periodsPerYear
         self.payment = self.calculate_payment()
 
     def calculate_payment(self):
         """
         Calculate the fixed yearly payment (normalized) that will pay off the loan by the end of the load duration.
         """
-        decimal = self.rate / 100  # shorthand
-        years = self.duration  # shorthand
-        return decimal * (1 + decimal) ** years / \
-               ( (1 + decimal) ** years - 1 )
+        return self.schedule()['payment'] * self.periodsPerYear
 
     @property
     def rate(self):
@@ -42,26 +128,208 @@ class Mortgage:
     @rate.setter
     def rate(self, r):
         self._rate = Rate(r)
+        # _rate is private, so assigning it is not counted as a change (see memo.Versioned); count it here,
+        # so that schedules memoized at the old rate are not reused
+        self._version += 1
         self.payment = self.calculate_payment()  # automatically update payment
 
+    @memoize
+    def schedule(self) -> dict:
+        """
+        Full amortization schedule, one entry per payment period (see amortize).
+        """
+        return amortize(self.rate, self.duration, self.periodsPerYear)
+
+    def _yearly(self, perPeriod):
+        """
+        Sum a per-period array into years; the 0th index stays the time of purchase.
+        """
+        yearly = np.zeros(perPeriod.shape[:-1] + (self.duration + 1,))
+        yearly[..., 1:] = perPeriod[..., 1:].reshape(perPeriod.shape[:-1] + (self.duration, self.periodsPerYear)).sum(axis=-1)
+        return yearly
+
+    @memoize
     def calculate_principle(self):
         """
         Return a numpy array with the paydown of the principle year by year.
         The nth index is the principle remaining after n years of payments.
+        The rate may be an array broadcasting against the year axis (e.g. shape (..., 1)).
         """
-        schedule = np.zeros(self.duration + 1)
-        schedule[0] = 1.0
-        for index in range(1, self.duration):
-            schedule[index] = (1.0 + self.rate/100) * schedule[index-1]
-            schedule[index] -= self.payment
-            log.debug("Year {0:02}: principle = {1:5.2f}".format(index, schedule[index]))
-        return schedule
+        return self.schedule()['balance'][..., ::self.periodsPerYear]
 
+    @memoize
     def calculate_interest(self):
         """
-        Return an array holding the normalized amount of interest payment each year.
+        Return an array holding the normalized amount of interest paid each year.
+        The nth index is the interest paid during year n; the 0th index is zero.
+        """
+        return self._yearly(self.schedule()['interest'])
+
+    @memoize
+    def calculate_payments(self):
+        """
+        Return an array holding the normalized payment made each year; the 0th index is zero.
+        """
+        payments = self.calculate_payment() * np.ones(self.duration + 1)
+        payments[..., 0] = 0
+        return payments
+
+    def withRate(self, rate):
+        """
+        Copy of this mortgage at another rate (e.g. a column vector, one rate per scenario), keeping its
+        other terms.  The copy starts without memoized schedules, so it never reuses this mortgage's.
+        """
+        mortgage = copy.copy(self)
+        mortgage.__dict__.pop('_cache', None)
+        mortgage.rate = rate
+        return mortgage
+
+
+class VariableMortgage(Mortgage):
+    """
+    NORMALIZED mortgage whose rate can change from year to year, paid yearly.
+    marketRates is the prevailing rate (percentage) in each year along the last axis, e.g. one row per scenario.
+    As such, the loan floats: its rate is the prevailing rate every year.  Without marketRates it keeps its
+    initial rate, as a fixed Mortgage would.  Subclasses decide how the loan's rate responds to marketRates
+    (see effectiveRates).
+    """
+    def __init__(self, rate: float, duration: int):
+        super().__init__(rate, duration, YEARLY)
+        self.marketRates = None
+
+    def calculate_payment(self):
+        """
+        Yearly payment (normalized) at the initial rate.
+        """
+        return amortize(self.rate, self.duration)['payment']
+
+    def prevailing(self) -> np.array:
+        """
+        Prevailing rate of each year: marketRates, or the initial rate throughout.
+        Broadcast against the initial rate, which may itself be a column vector (one rate per scenario).
+        """
+        initial = np.asarray(self.rate, dtype=float)
+        if self.marketRates is None:
+            return np.broadcast_to(initial, initial.shape[:-1] + (self.duration,))
+        market = np.asarray(self.marketRates, dtype=float)[..., :self.duration]
+        return np.broadcast_to(market, np.broadcast_shapes(market.shape, initial.shape))
+
+    def initial(self, shape) -> np.array:
+        """
+        Initial rate of each scenario, as an array of the given shape (the leading axes of prevailing()).
         """
-        return self.calculate_principle() * self.rate/100
+        initial = np.asarray(self.rate, dtype=float)
+        return np.broadcast_to(initial[..., 0] if initial.ndim else initial, shape).copy()
+
+    def effectiveRates(self) -> tuple:
+        """
+        Return (rate of the loan in each year, fraction of the balance added at the end of each year or None).
+        """
+        return self.prevailing(), None
+
+    @memoize
+    def schedule(self) -> dict:
+        rates, refinanceCost = self.effectiveRates()
+        return amortizeVariable(rates, refinanceCost)
+
+    @memoize
+    def calculate_payments(self):
+        return self.schedule()['payment']
+
+
+class AdjustableMortgage(VariableMortgage):
+    """
+    Adjustable-rate mortgage (ARM): the initial rate holds for fixedYears (and at least the first year), then
+    every resetEvery years the rate resets to the index (marketRates, observed at the end of the previous year)
+    plus margin, moving at most periodicCap per reset and staying within [floor, rate + lifetimeCap].
+    """
+    def __init__(self, rate: float, duration: int,
+                 margin=2.5,                # added to the index at each reset (percentage points)
+                 fixedYears=5,              # years at the initial rate, e.g. 5 for a 5/1 ARM
+                 resetEvery=1,              # years between resets after that
+                 periodicCap=2.,            # largest change at a single reset (percentage points)
+                 lifetimeCap=5.,            # largest rise above the initial rate (percentage points)
+                 floor=None                 # lowest rate; defaults to the margin
+                 ):
+        self.margin = margin
+        self.fixedYears = fixedYears
+        self.resetEvery = resetEvery
+        self.periodicCap = periodicCap
+        self.lifetimeCap = lifetimeCap
+        self.floor = margin if floor is None else floor
+        super().__init__(rate, duration)
+
+    def effectiveRates(self) -> tuple:
+        index = self.prevailing()
+        if self.marketRates is None:
+            return index, None      # no index path: the initial rate throughout
+        rates = np.empty(index.shape)
+        current = self.initial(index.shape[:-1])
+        ceiling = current + self.lifetimeCap
+        # resets depend on the previous rate through the caps, so step through the years (vectorized over paths)
+        for year in range(self.duration):
+            # a reset due at origination (fixedYears=0) has no index observation yet: keep the initial rate
+            if year > 0 and year >= self.fixedYears and (year - self.fixedYears) % self.resetEvery == 0:
+                target = index[..., year - 1] + self.margin
+                current = np.clip(target, current - self.periodicCap, current + self.periodicCap)
+                current = np.clip(current, self.floor, ceiling)
+            rates[..., year] = current
+        return rates, None
+
+
+class RefinanceMortgage(VariableMortgage):
+    """
+    Fixed-rate mortgage that is refinanced, at the end of a year, into the prevailing rate (marketRates) for the
+    remaining term.  By default it refinances whenever the prevailing rate is at least threshold percentage points
+    below the loan's current rate; if year is given it refinances at the end of that year only.
+    Closing costs (closingCost, percentage of the balance) are rolled into the new loan.
+    """
+    def __init__(self, rate: float, duration: int,
+                 threshold=1.,              # refinance once rates drop this far (percentage points)
+                 closingCost=2.,            # closing costs of each refinance (percentage of the balance)
+                 year=None                  # refinance at the end of this year instead of by threshold
+                 ):
+        self.threshold = threshold
+        self.closingCost = closingCost
+        self.year = year
+        super().__init__(rate, duration)
+
+    def effectiveRates(self) -> tuple:
+        rates, refinanceCost, _ = self._refinancePlan()
+        return rates, refinanceCost
+
+    def _refinancePlan(self) -> tuple:
+        """
+        Return (rate in each year, fraction of the balance added at the end of each year, whether the loan is
+        refinanced at the end of each year).  Refinances are recorded apart from their costs, which may be 0.
+        """
+        market = self.prevailing()
+        rates = np.empty(market.shape)
+        refinanceCost = np.zeros(market.shape)
+        refinances = np.zeros(market.shape, dtype=bool)
+        current = self.initial(market.shape[:-1])
+        for year in range(1, self.duration + 1):
+            rates[..., year - 1] = current
+            if year == self.duration:
+                break
+            if self.year is None:
+                refinance = market[..., year - 1] <= current - self.threshold
+            else:
+                refinance = np.full(current.shape, year == self.year)
+            refinances[..., year - 1] = refinance
+            refinanceCost[..., year - 1] = np.where(refinance, self.closingCost / 100, 0.)
+            current = np.where(refinance, market[..., year - 1], current)
+        return rates, refinanceCost, refinances
+
+    @memoize
+    def refinanced(self) -> np.array:
+        """
+        Whether the loan has been refinanced by the end of each year (0th index: at purchase).
+        """
+        _, _, refinances = self._refinancePlan()
+        done = np.zeros(refinances.shape[:-1] + (self.duration + 1,), dtype=bool)
+        done[..., 1:] = np.logical_or.accumulate(refinances, axis=-1)
+        return done
 
 
 def roll(func):
@@ -71,12 +339,13 @@ def roll(func):
     with an "extra" element, the zeroth.
     However, a repeated operation is to shift the array, and fill the 0th index with 0.
     That is what this decorator does to a function that return an array of, say, 30.
+    The shift is done in place, so the decorated function must return a freshly computed array.
     """
     def newFunc(obj):
         array = func(obj)
-        rolledArray = np.roll(array, 1)
-        rolledArray[0] = 0
-        return rolledArray
+        array[..., 1:] = array[..., :-1]    # shift along the year axis only
+        array[..., 0] = 0
+        return array
     return newFunc
 
 
@@ -99,7 +368,8 @@ class House(Abode):
                  closingCostBuy=5.,             # closing costs on purchase
                  closingCostSell=6.,            # closing cost on sale
                  rollClosingCost=False,         # roll costs into mortgage (True) or pay upfront (False)
-                 pmi_rate=None
+                 pmi_rate=None,
+                 marginalTax=None               # marginal income tax rate (percentage) applied to deductions
                  ):
         self.price = price
         self.mortgage = mortgage
@@ -114,12 +384,47 @@ class House(Abode):
         self.rollClosingCost = rollClosingCost
 
         self.pmi_rate = pmi_rate if pmi_rate else House.default_pmi_rate
+        self.marginalTax = marginalTax if marginalTax is not None else self.MARGINAL_TAX
 
-        self.loan = price * (1-down/100)
-        if rollClosingCost:
-            self.loan += price * closingCostBuy/100
+    @property
+    def loan(self):
+        """Amount borrowed: price less the down payment, plus closing costs if they are rolled into the mortgage."""
+        loan = self.price * (1-self.down/100)
+        if self.rollClosingCost:
+            loan = loan + self.price * self.closingCostBuy/100
+        return loan
+
+    @property
+    def nYears(self):
+        """Horizon of the shared market and inflation paths: the length of the mortgage."""
+        return self.mortgage.duration
 
-    @round
+    def setPaths(self, marketReturnYearly, inflationYearly, rng=None, appreciationYearly=None, mortgageRates=None):
+        """
+        As Abode.setPaths; appreciationYearly, if given, replaces draws from self.appreciation
+        (e.g. a path from scenario.ScenarioGenerator, correlated with market and inflation).
+        mortgageRates (as decimals, like the other paths) become the marketRates of a VariableMortgage.
+        """
+        super().setPaths(marketReturnYearly, inflationYearly, rng)
+        self._appreciationPath = None if appreciationYearly is None else compound(appreciationYearly)
+        if mortgageRates is not None and isinstance(self.mortgage, VariableMortgage):
+            # replace rather than modify the mortgage, which other houses may share
+            self.mortgage = copy.copy(self.mortgage)
+            self.mortgage.__dict__.pop('_cache', None)
+            self.mortgage.marketRates = np.asarray(mortgageRates) * 100
+
+    @memoize
+    def appreciationCumulative(self):
+        """
+        Compounded appreciation over the mortgage duration, drawn once per House state so that value, tax,
+        upkeep and insurance all follow the same appreciation path.
+        """
+        if self.__dict__.get('_appreciationPath') is not None:
+            return self._appreciationPath
+        _, compounded = self.appreciation.cumulative(self.mortgage.duration, self.nPaths, self.rng)
+        return compounded
+
+    @memoize
     def value(self, nYears):
         """
         Return a numpy array of house values due to yearly appreciation.
@@ -127,10 +432,13 @@ class House(Abode):
         and the 0th index being the value at time of purchase.
         Consider adding variance to the appreciation rate.
         """
-        _, compounded = self.appreciation.cumulative(nYears)
+        if nYears <= self.mortgage.duration:
+            compounded = self.appreciationCumulative()[..., :nYears+1]
+        else:
+            _, compounded = self.appreciation.cumulative(nYears, self.nPaths, self.rng)
         return self.price * compounded
 
-    @round
+    @memoize
     def equity(self):
         """
         Return a numpy array of equity: the amount of the mortgage paid off.
@@ -139,7 +447,7 @@ class House(Abode):
         """
         return ((1 - self.mortgage.calculate_principle()) * self.loan) + self.down/100 * self.price
 
-    @round
+    @memoize
     def principal(self):
         """
         Return a numpy array of principal: the amount of the mortgage remaining.
@@ -148,19 +456,18 @@ class House(Abode):
         """
         return self.mortgage.calculate_principle() * self.loan
 
-    @round
+    @memoize
     def proceeds(self):
         """
         When selling a home, you must subtract closing costs from the sale, then the loan must be repaid.
         Return an array of length self.duration + 1 in which the nth index contains the proceeds of the sale if
         the house is sold after n years.
         """
-        valueByYear = self.value(self.mortgage.duration)
-        realizedValue = valueByYear * (1 - self.closingCostSell/100)
-        net = realizedValue - self.principal()
-        return net
+        realizedValue = self.value(self.mortgage.duration) * (1 - self.closingCostSell/100)
+        # not in place: value and principal may broadcast over different inputs (see sweep)
+        return realizedValue - self.principal()
 
-    @round
+    @memoize
     @roll
     def pmi(self):
         """
@@ -178,65 +485,75 @@ class House(Abode):
         return pmiPayments
 
     def mortgagePayment(self) -> float:
-        """Returns yearly mortgage payment, a fixed quantity"""
+        """Returns yearly mortgage payment, a fixed quantity (the initial payment, for a VariableMortgage)"""
         return self.mortgage.calculate_payment() * self.loan
 
-    @round
-    @roll
-    def mortgagePayments(self) -> float:
-        """Returns array of yearly mortgage payment, a fixed quantity"""
-        return np.ones(self.mortgage.duration + 1) * self.mortgagePayment()
+    @memoize
+    def mortgagePayments(self) -> np.array:
+        """Returns array of yearly mortgage payments; the 0th entry is zero"""
+        return self.mortgage.calculate_payments() * self.loan
 
-    @round
+    @memoize
     @roll
     def taxPayments(self) -> np.array:
-        _, appreciationCumulative = \
-            self.appreciation.cumulative(self.mortgage.duration)
+        appreciationCumulative = self.appreciationCumulative()
         # recall appreciationCumulative will be of length nYears+1
         return self.tax * appreciationCumulative
 
-    @round
+    @memoize
     @roll
     def upkeepPayments(self):
-        _, cumulative_appreciation = self.appreciation.cumulative(self.mortgage.duration)
+        cumulative_appreciation = self.appreciationCumulative()
         return self.upkeep/100 * cumulative_appreciation * self.price
 
-    @round
+    @memoize
     @roll
     def insurancePayments(self) -> np.array:
-        _, appreciationCumulative = \
-            self.appreciation.cumulative(self.mortgage.duration)
+        appreciationCumulative = self.appreciationCumulative()
         # recall appreciationCumulative will be of length nYears+1
         return self.insurance / 100 * self.price * appreciationCumulative
 
 
-    def mortgageDeduction(self):
-        pass
+    @memoize
+    @roll
+    def standardDeduction(self) -> np.array:
+        """
+        Standard deduction each year, indexed to the inflation path (the nth entry applies to year n's taxes).
+        """
+        return self.STD_DEDUCTION * self.inflationCompounded
+
+    @memoize
+    def mortgageDeduction(self) -> np.array:
+        """
+        Income tax saved each year by itemizing: mortgage interest plus property tax (up to the SALT cap),
+        to the extent that they exceed the standard deduction, times the marginal tax rate.
+        Years in which the standard deduction is larger save nothing.
+        """
+        itemized = self.interest() + np.minimum(self.taxPayments(), self.SALT_CAP)
+        return self.marginalTax/100 * np.maximum(itemized - self.standardDeduction(), 0)
 
-    @round
+    @memoize
     def oop(self):
         """Calculate out of pocket expenses"""
-        expenses = self.upkeepPayments()
-        expenses += self.taxPayments()
-        expenses += self.mortgagePayments()
-        expenses += self.insurancePayments()
-        # expenses += self.mortgageDeduction()
-        expenses[0] += self.down/100 * self.price
+        expenses = self.upkeepPayments() + self.taxPayments() + self.mortgagePayments() + self.insurancePayments()
+        # not in place: the deduction may also vary with the inflation path
+        expenses = expenses - self.mortgageDeduction()
+        # slice with :1 (not 0) so that array-valued inputs, which carry a trailing year axis, line up
+        expenses[..., :1] += self.down/100 * self.price
         if not self.rollClosingCost:
             # if the closing costs were not rolled into mortgage, they were paid out-of-pocket
             # at time of purchase, so add them to the 0th index
-            expenses[0] += self.closingCostBuy/100 * self.price
-        return expenses.round()
+            expenses[..., :1] += self.closingCostBuy/100 * self.price
+        return expenses
 
-    @round
+    @memoize
     def interest(self):
         """
         Array of interest costs due to mortgage.
         Array lenght is self.mortgage.duration+1; the nth entry is the mortgage paid on the nth year.
         The 0th entry is zero.
         """
-        interestArray = self.principal() * self.mortgage.rate / 100
-        return np.roll(interestArray, 1)
+        return self.mortgage.calculate_interest() * self.loan
 
     def pandaize(self) -> pd.DataFrame:
         data = {}
@@ -250,11 +567,15 @@ class House(Abode):
         data['Upkeep'] = self.upkeepPayments()
         data['Insurance'] = self.insurancePayments()
         data['PMI'] = self.pmi()
+        data['Deduction'] = self.mortgageDeduction()
         data['OOP'] = self.oop()
         data['OppCostR'] = self.opportunityCostRealized()
         data['OOP_Invest']  = self.oopInvested()
         data['NetLoss']  = self.oopInvested() - self.proceeds()
         df = pd.DataFrame(data=data)
+        # everything is computed at full precision; round dollar amounts for display only
+        dollars = df.columns.drop(['Market', 'Inflation'])
+        df[dollars] = df[dollars].round()
         return df
 
     def writeCsv(self, filename=None):
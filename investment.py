@@ -1,3 +1,4 @@
+import bisect
 import csv
 import datetime
 import numpy as np
@@ -8,6 +9,7 @@ import pandas as pd
 from typing import List
 
 import allocation
+import bisection
 import investment_types
 
 
@@ -18,6 +20,15 @@ class Account(pd.DataFrame):
                  'alloc',
                  'file'
                  ]
+    # rows added by status()/transact() but not yet merged into the DataFrame (see commit()), and the
+    # index of status lines (see _statusindex()).  Internal names, so that they are not carried over to
+    # DataFrames derived from this one.
+    _internal_names = pd.DataFrame._internal_names + ['_journal', '_statuses', '_latest', '_arrays']
+    _internal_names_set = set(_internal_names)
+    _journal = ()
+    _statuses = None
+    _latest = None
+    _arrays = None
 
     def __init__(self,
                  data=None,
@@ -124,16 +135,118 @@ class Account(pd.DataFrame):
             fund_status_string = input("Current value of " + f + ": ")
             current[f] = int(fund_status_string)
 
-        New_DataFrame_toAppend = pd.DataFrame(current, index=[0])
-        self.append_dataframe(New_DataFrame_toAppend)
+        self._journal_row(current)
+
+    def _journal_row(self, row: dict):
+        """
+        Queue a row (column -> value) to be added to the DataFrame on the next commit().
+        """
+        if not self._journal:
+            self._journal = []
+        self._journal.append(row)
+        if row['type'] == 'status' and self._statuses is not None:
+            # keep the index current: after every status line of the same or an earlier date
+            dates, rows = self._statuses
+            position = bisect.bisect_right(dates, row['date'])
+            dates.insert(position, row['date'])
+            rows.insert(position, row)
+            if position == len(rows) - 1:
+                self._latest = None
+            self._arrays = None
+
+    def _statusindex(self) -> tuple:
+        """
+        Status lines, committed or queued, in date order (lines of the same date in the order added),
+        as (list of dates, list of rows as dicts).  Built on first use and then maintained by _journal_row,
+        so finding a status line does not scan the ledger.
+        """
+        if self._statuses is None:
+            committed = pd.DataFrame(self)
+            committed = committed[committed['type'] == 'status']
+            rows = committed.to_dict('records') + [row for row in self._journal if row['type'] == 'status']
+            # stable: committed lines come first, and are already in date order
+            rows.sort(key=lambda row: row['date'])
+            self._statuses = ([row['date'] for row in rows], rows)
+            self._latest = None
+            self._arrays = None
+        return self._statuses
+
+    def _statusarrays(self) -> tuple:
+        """
+        The status index as arrays: (sorted datetime64[D] dates, (dates x funds) amounts), keeping only the
+        last status line of each date.  Cached until a status line is added.
+        """
+        if self._arrays is None:
+            dates, rows = self._statusindex()
+            dates = np.array(dates, dtype='datetime64[D]')
+            amounts = pd.DataFrame(rows, columns=self.funds).fillna(0).to_numpy(dtype=float)
+            last = np.append(dates[1:] != dates[:-1], True)
+            self._arrays = (dates[last], amounts[last])
+        return self._arrays
+
+    @staticmethod
+    def _datetimes(dates) -> np.array:
+        """
+        Convert a date, or list of dates (anything pandas.to_datetime accepts), to datetime64[D]: a scalar for a
+        single date, otherwise an array.
+        """
+        return np.asarray(pd.to_datetime(dates), dtype='datetime64[ns]').astype('datetime64[D]')[()]
+
+    def holdings_asof(self, dates):
+        """
+        Amount in each fund as of date(s), i.e. from the latest status line on or before each date, found
+        by binary search.  NaN before the first status line.
+        :param dates: a date, or a list of dates
+        :return: a Series (fund -> amount) for a single date, otherwise a DataFrame indexed by date
+        """
+        statusDates, amounts = self._statusarrays()
+        when = self._datetimes(dates)
+        position = np.searchsorted(statusDates, np.atleast_1d(when), side='right') - 1
+        values = np.where((position >= 0)[:, None], amounts[np.maximum(position, 0)], np.nan)
+        if np.ndim(when) == 0:
+            return pd.Series(values[0], index=self.funds)
+        return pd.DataFrame(values, index=pd.DatetimeIndex(when, name='date'), columns=self.funds)
+
+    def history(self, freq=None, start=None, end=None) -> pd.DataFrame:
+        """
+        Amount in each fund over time, forward-filled between status lines.
+        :param freq: pandas frequency (e.g. 'W', 'ME', 'QE') of the dates to report; by default, the status dates
+        :param start, end: date range (default: first to last status line)
+        :return: DataFrame indexed by date, one column per fund
+        """
+        statusDates, _ = self._statusarrays()
+        return self.holdings_asof(_grid([statusDates], freq, start, end))
+
+    def _invalidate(self):
+        """
+        Drop the status index, e.g. after changing columns or editing the DataFrame directly.
+        """
+        self._statuses = None
+        self._latest = None
+        self._arrays = None
+
 
     def append_dataframe(self, df):
+        """
+        Queue the rows of df to be added to the DataFrame on the next commit().
+        """
+        for row in df.to_dict('records'):
+            self._journal_row(row)
+
+    def commit(self):
+        """
+        Merge rows queued by status(), transact() and append_dataframe() into the DataFrame, with one
+        concatenation and one sort by date, rows of the same date keeping the order in which they were added.
+        Account methods that read the ledger commit first; call commit() before reading it directly
+        (e.g. account['fundA']) after adding rows.
+        """
+        if not self._journal:
+            return
+        journal = pd.DataFrame(self._journal)
+        self._journal = []
+        combined = pd.concat([pd.DataFrame(self), journal], ignore_index=True, sort=False)
         # can't believe this works, but it does and retains metadata!
-        super().__init__(data=self.append(df,
-                                          sort=False,
-                                          ignore_index=True
-                                          )
-                         )
+        super().__init__(data=combined.sort_values(by='date', kind='stable', ignore_index=True))
 
     @property
     def total(self):
@@ -144,14 +257,25 @@ class Account(pd.DataFrame):
         current = self._laststatus()
         return current[self.funds].sum()
 
-    def _laststatus(self):
+    def _laststatus(self, date=None):
         """
-        Get the latest 'status' line from DataFrame
-
-        :return: DataFrame of length one
+        Get the latest 'status' line, including rows not yet committed.
+        :param date: if given (a datetime.date), the latest status line on or before date
+        :return: Series holding the status line
         """
-        status_df = self.loc[self['type'] == 'status']
-        return status_df.sort_index().iloc[-1]
+        dates, rows = self._statusindex()
+        if date is None:
+            if self._latest is None and rows:
+                self._latest = pd.Series(rows[-1])
+            if self._latest is not None:
+                return self._latest
+            position = 0
+        else:
+            position = bisect.bisect_right(dates, date)
+        if position == 0:
+            raise ValueError("Account {0}: no status line{1}".format(
+                getattr(self, 'name', ''), '' if date is None else ' on or before {0}'.format(date)))
+        return pd.Series(rows[position - 1])
 
     def service_allocations(self) -> List[int]:
         """
@@ -163,7 +287,8 @@ class Account(pd.DataFrame):
 
     def service_investment_type(self, it: investment_types.InvestmentType):
         type_matches = [a for a in self.alloc if type(a.itype) == type(it)]
-        subtotals = [sum(self._laststatus()[a.fundlist]) for a in type_matches]
+        latest = self._laststatus()
+        subtotals = [sum(latest[a.fundlist]) for a in type_matches]
         return sum(subtotals)
 
 
@@ -203,32 +328,18 @@ class Account(pd.DataFrame):
             except ValueError as error:
                 raise ValueError('Cannot convert ' + str(amount) + ' into an int') from error
 
-        New_DataFrame_toAppend = pd.DataFrame(current, index=[0])
-        self.append_dataframe(New_DataFrame_toAppend)
+        self._journal_row(current)
 
         # update 2021-02-07
         # last_status = self._laststatus()
-        last_status = self[self['date'] <= current['date']]._laststatus()
+        last_status = self._laststatus(date=current['date'])
+        status = dict(current)
         for (each_fund, amount) in zip(self.funds, amounts):
-            current[each_fund] += last_status[each_fund]
-            print(current[each_fund])
-        current['type'] = 'status'
-        self.append_dataframe(pd.DataFrame(current, index=[0]))
-        self._mysort()
-
-    def _mysort(self):
-        """
-        Sort the DataFrame by date and then index, e.g. sort by date, but for all status and
-        transaction lines with the same date, preserve their original order
-        """
-        # we will use the sort_values method of DataFrame, which cannot operate
-        # on both columns and rows (indices).  So make a column duplicating index.
-        self['indexer'] = self.index
-        self.sort_values(by=['date', 'indexer'],  # sort first by date, then index
-                         inplace=True)
-        self.drop('indexer',  # remove auxiliary column; it served its purpose
-                  axis=1,  # tell drop to remove a column, not index
-                  inplace=True)
+            status[each_fund] += last_status[each_fund]
+            print(status[each_fund])
+        status['type'] = 'status'
+        # rows are merged (and sorted by date) on the next commit()
+        self._journal_row(status)
 
     def filewrite(self, trial=False):
         """
@@ -239,6 +350,7 @@ class Account(pd.DataFrame):
         trial: True or False, debug option to write to "trial" file
         (e.g. does not overwrite original file)
         """
+        self.commit()
         filesplit = self.file.split('/')
         base, extension = filesplit[-1].split('.')
         # return path terminated with '/', or empty string (in
@@ -287,15 +399,59 @@ class Account(pd.DataFrame):
 
     def performance(self):
         """
-        Evaluate performance of each fund based on last two status lines.
+        Evaluate performance of each fund based on last two status lines (of different dates): the
+        annualized time-weighted return (percentage), so money invested in between does not count as return.
         :return:
         """
-        status_lines = self[self['type'] == 'status']
-        dtime = status_lines.iloc[-1].date - status_lines.iloc[-2].date
-        years = np.abs(dtime.days) / 365
-        justfunds = status_lines[self.funds]
-        change = justfunds.iloc[-1] / justfunds.iloc[-2]
-        return (2.72 ** (np.log(change) / years) - 1) * 100
+        statusDates, _ = self._statusarrays()
+        returns = self.returns(start=statusDates[-2], end=statusDates[-1])
+        return returns['TWR'][self.funds]
+
+    def _flows(self, grid: np.array) -> np.array:
+        """
+        Money invested (from 'transact' lines) in each fund during each period of grid (datetime64[D]):
+        row i holds the transactions dated after grid[i-1] and up to grid[i].  Row 0, and transactions
+        outside the grid, are left out.
+        :return: (dates x funds) array
+        """
+        self.commit()
+        transactions = self[self['type'] == 'transact']
+        flows = np.zeros((len(grid), len(self.funds)))
+        if len(transactions) and len(grid):
+            period = np.searchsorted(grid, np.array(transactions['date'].tolist(), dtype='datetime64[D]'))
+            inside = (period > 0) & (period < len(grid))
+            amounts = transactions[self.funds].fillna(0).to_numpy(dtype=float)
+            np.add.at(flows, period[inside], amounts[inside])
+        return flows
+
+    def _holdings_and_flows(self, grid: np.array) -> tuple:
+        """
+        Amount in each fund at each date of grid (datetime64[D]), 0 before the first status line, and the money
+        invested in it during each period (see _flows).  A fund's first appearance is money invested, not a
+        return: in a period that starts empty, the flows are the amount at its end.
+        :return: two (dates x funds) arrays
+        """
+        values = np.nan_to_num(self.holdings_asof(grid).to_numpy())
+        flows = self._flows(grid)
+        appears = np.zeros(values.shape, dtype=bool)
+        appears[1:] = (values[:-1] == 0) & (values[1:] != 0)
+        flows[appears] = values[appears]
+        return values, flows
+
+    def returns(self, start=None, end=None, annualize=True) -> pd.DataFrame:
+        """
+        Time-weighted (TWR) and money-weighted (MWR, i.e. XIRR) returns of each fund and of the whole
+        account ('Total') between start and end (default: first and last status line), as percentages.
+        'transact' lines are the cash flows: TWR chains the growth between status lines net of them, and
+        MWR is the rate at which the value at start plus every transaction grows into the value at end.
+        :param annualize: if True, both are annual rates; otherwise, returns over the whole window
+        """
+        statusDates, _ = self._statusarrays()
+        grid = _window([statusDates], start, end)
+        values, flows = self._holdings_and_flows(grid)
+        values = np.column_stack([values, values.sum(axis=1)])
+        flows = np.column_stack([flows, flows.sum(axis=1)])
+        return _returns(values, flows, grid, list(self.funds) + ['Total'], annualize)
 
     def add_fund(self, name: str):
         """
@@ -311,12 +467,15 @@ class Account(pd.DataFrame):
                               ).format(name, self.name)
                              )
 
+        # queued rows predate the fund, so merge them before adding its column
+        self.commit()
         print("Adding new fund {0} to account {1}:{2}.".format(name,
                                                                self.name,
                                                                self.subname)
               )
         self[name] = 0
         self.funds.append(name)
+        self._invalidate()      # status lines gain the new fund
 
         print("Existing allocations:")
         self.alloc.print()
@@ -337,6 +496,85 @@ class Account(pd.DataFrame):
             print("Adding fund to Allocation failed; removing fund from Account.")
             del self[name]
             self.funds.pop(-1)
+            self._invalidate()
+
+
+def _grid(statusDates: list, freq=None, start=None, end=None) -> np.array:
+    """
+    Dates at which to report a history: every date of the given status date arrays, or, if freq is given,
+    a regular range at that pandas frequency; either way limited to [start, end].
+    """
+    known = np.concatenate(statusDates) if statusDates else np.array([], dtype='datetime64[D]')
+    if len(known) == 0:
+        return known
+    first = Account._datetimes(start) if start is not None else known.min()
+    last = Account._datetimes(end) if end is not None else known.max()
+    if freq is None:
+        grid = np.unique(known)
+        return grid[(grid >= first) & (grid <= last)]
+    return Account._datetimes(pd.date_range(first, last, freq=freq))
+
+
+def _window(statusDates: list, start=None, end=None) -> np.array:
+    """
+    Dates of a return calculation: start, end and every status date in between (see _grid).
+    """
+    known = np.concatenate(statusDates)
+    first = Account._datetimes(start) if start is not None else known.min()
+    last = Account._datetimes(end) if end is not None else known.max()
+    if not first < last:
+        raise ValueError("Return window must end after it starts; got {0} to {1}".format(first, last))
+    return np.union1d(_grid(statusDates, None, first, last), [first, last])
+
+
+def time_weighted(values: np.array, flows: np.array) -> np.array:
+    """
+    Time-weighted return of each column of values (dates x n), flows[i] having been invested during the
+    period ending at date i: the growth of each period net of its flows, (values[i] - flows[i]) / values[i-1],
+    chained over all periods.  A period that starts empty has no growth.
+    """
+    before, after = values[:-1], values[1:]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        growth = np.where(before > 0, (after - flows[1:]) / before, 1.)
+    return growth.prod(axis=0) - 1
+
+
+def xirr(cashflows: np.array, days: np.array, tolerance=1e-10, maxEvaluations=100) -> np.array:
+    """
+    Annual internal rate of return of each row of cashflows (n x dates), made the given number of days after
+    the first (negative: money in, positive: money out).  Solved by bisection on every row at once, over
+    rates from -99.995% to 14700%; NaN where the net present value does not change sign over that range,
+    including rows with no cash flows at all (e.g. a fund held only on the last date).
+    """
+    cashflows = np.atleast_2d(cashflows)
+    years = np.asarray(days, dtype=float) / 365.
+    n = len(cashflows)
+
+    def npv(logRate):
+        # continuously compounded: (1 + rate) ** -years == exp(-log(1 + rate) * years)
+        return (cashflows * np.exp(-logRate[:, None] * years)).sum(axis=1)
+
+    low, high, valid = bisection.solve(npv, np.full(n, -10.), np.full(n, 5.), tolerance, maxEvaluations)
+    return np.where(valid, np.expm1((low + high) / 2), np.nan)
+
+
+def _returns(values: np.array, flows: np.array, grid: np.array, labels: list, annualize=True) -> pd.DataFrame:
+    """
+    TWR and MWR (percentages) of each column of values and flows (dates x n) over the dates of grid.
+    """
+    days = (grid - grid[0]).astype(float)
+    years = days[-1] / 365.
+    twr = time_weighted(values, flows)
+    # money in: the value at start and every later investment; money out: the value at end
+    cashflows = -flows.T
+    cashflows[:, 0] = -values[0]
+    cashflows[:, -1] += values[-1]
+    mwr = xirr(cashflows, days)
+    if annualize:
+        twr = np.exp(np.log1p(twr) / years) - 1
+    else:
+        mwr = np.exp(np.log1p(mwr) * years) - 1
+    return pd.DataFrame({'TWR': twr * 100, 'MWR': mwr * 100}, index=pd.Index(labels))
 
 
 class Portfolio(object):
@@ -352,16 +590,154 @@ class Portfolio(object):
                               ' Allocation; got {0}').format(type(alloc))
                              )
         self.alloc = alloc
+        self._compiled = None
+
+    def compile(self):
+        """
+        Compile the latest holdings into matrices:
+        funds -- label (fund name) of each row
+        holdings -- (funds x accounts) amount of each fund in each account
+        mapping -- (allocation entries x funds) how many times each fund counts towards each entry of
+        self.alloc, i.e. how many of the account's AllocationEntries of that investment type list the fund
+        Rows are normally one per fund name; a fund that accounts assign to different investment types
+        gets one row per assignment.  The result is cached until an account's latest status changes, so
+        repeated valuations and rebalance() what-ifs reuse it.
+        :return: (funds, holdings, mapping)
+        """
+        # an account's latest status line is a new object whenever it changes (see Account._laststatus)
+        latest = [acc._laststatus() for acc in self.accounts]
+        types = [type(a.itype) for a in self.alloc]
+        if self._compiled is not None:
+            compiledLatest, compiledTypes, compiled = self._compiled
+            if compiledTypes == types and len(compiledLatest) == len(latest) and \
+                    all(old is new for old, new in zip(compiledLatest, latest)):
+                return compiled
+
+        rows = {}           # (fund name, investment types assigned to it) -> row
+        accountRows = []    # for each account, the row of each of its funds
+        for acc in self.accounts:
+            accountRows.append([])
+            for fund in acc.funds:
+                # type(itype), not isinstance: a StockInt entry is not a Stock entry (see service_investment_type)
+                assigned = tuple(sorted((type(a.itype) for a in acc.alloc if fund in a.fundlist),
+                                        key=lambda itype: itype.__name__))
+                accountRows[-1].append(rows.setdefault((fund, assigned), len(rows)))
+        holdings = np.zeros((len(rows), len(self.accounts)))
+        for column, (acc, status, accRows) in enumerate(zip(self.accounts, latest, accountRows)):
+            # a blank fund cell holds nothing, as in _statusarrays
+            holdings[accRows, column] = status[acc.funds].fillna(0).to_numpy(dtype=float)
+        mapping = np.zeros((len(types), len(rows)))
+        for (fund, assigned), row in rows.items():
+            for t, itype in enumerate(types):
+                mapping[t, row] = assigned.count(itype)
+        funds = [fund for fund, _ in rows]
+
+        self._accountRows = accountRows
+        self._compiled = (latest, types, (funds, holdings, mapping))
+        return funds, holdings, mapping
 
     @property
     def total(self):
-        subtotals = [a.total for a in self.accounts]
-        return sum(subtotals)
+        _, holdings, _ = self.compile()
+        return holdings.sum()
+
+    def exposures(self) -> pd.DataFrame:
+        """
+        Amount held in each investment type of self.alloc (rows) in each account (columns).
+        """
+        _, holdings, mapping = self.compile()
+        return pd.DataFrame(mapping @ holdings,
+                            index=[a.itype.name for a in self.alloc],
+                            columns=[acc.name for acc in self.accounts])
 
     def service_allocations(self):
-        x = [sum([acc.service_investment_type(a.itype) for acc in self.accounts]) for a in self.alloc]
-        return x
+        _, holdings, mapping = self.compile()
+        return (mapping @ holdings.sum(axis=1)).tolist()
+
+    def drift(self, new_funds=0) -> np.array:
+        """
+        Fraction of the portfolio (plus new_funds) held in each entry of self.alloc, less its target percent.
+        """
+        current = np.array(self.service_allocations())
+        targets = np.array([a.percent for a in self.alloc])
+        return current / (current.sum() + new_funds) - targets
 
     def rebalance(self, new_funds=0):
         self.alloc.rebalance(self.service_allocations(),
                              new_funds=new_funds)
+
+    def history(self, freq='ME', by='account', start=None, end=None) -> pd.DataFrame:
+        """
+        Value over time of each account, fund or investment type, forward-filled between status lines.
+        Every account is looked up at every date at once (see Account.holdings_asof) and the results are
+        aggregated with the matrices of compile(); an account counts as empty before its first status line.
+        :param freq: pandas frequency (e.g. 'W', 'ME', 'QE') of the dates to report; None for every status date
+        :param by: 'account', 'fund' or 'type' (the entries of self.alloc)
+        :param start, end: date range (default: first to last status line of any account)
+        :return: DataFrame indexed by date, one column per account, fund or investment type
+        """
+        grid = _grid([acc._statusarrays()[0] for acc in self.accounts], freq, start, end)
+        return self._valuation(grid, by)
+
+    def asof(self, date, by='account') -> pd.Series:
+        """
+        Value of each account, fund or investment type (see history) as of date.
+        """
+        return self._valuation(Account._datetimes([date]), by).iloc[0]
+
+    def _valuation(self, grid: np.array, by: str) -> pd.DataFrame:
+        """
+        Value of each account, fund or investment type at each date of grid (datetime64[D]).
+        """
+        values, labels = self._gather(grid, lambda acc: np.nan_to_num(acc.holdings_asof(grid).to_numpy()), by)
+        return pd.DataFrame(values, index=pd.DatetimeIndex(grid, name='date'), columns=labels)
+
+    def _gather(self, grid: np.array, amounts, by: str) -> tuple:
+        """
+        Aggregate amounts(account), a (dates x funds of the account) array, over the portfolio by account,
+        fund or investment type, using the rows and mapping of compile().
+        :return: ((dates x accounts, funds or types) array, column labels)
+        """
+        if by not in ('account', 'fund', 'type'):
+            raise ValueError("Portfolio: by must be 'account', 'fund' or 'type'; got {0}".format(by))
+        funds, _, mapping = self.compile()
+
+        # (dates x rows of compile()) amounts, summed over accounts
+        values = np.zeros((len(grid), len(funds)))
+        totals = np.zeros((len(grid), len(self.accounts)))
+        for column, (acc, accRows) in enumerate(zip(self.accounts, self._accountRows)):
+            accAmounts = amounts(acc) if len(grid) else np.zeros((0, len(accRows)))
+            values[:, accRows] += accAmounts
+            totals[:, column] = accAmounts.sum(axis=1)
+
+        if by == 'account':
+            return totals, [acc.name for acc in self.accounts]
+        if by == 'type':
+            return values @ mapping.T, [a.itype.name for a in self.alloc]
+        # a fund assigned to different investment types has several rows; report it once
+        names = {}
+        column = [names.setdefault(fund, len(names)) for fund in funds]
+        byFund = np.zeros((len(grid), len(names)))
+        np.add.at(byFund.T, column, values.T)
+        return byFund, list(names)
+
+    def returns(self, start=None, end=None, by='account', annualize=True) -> pd.DataFrame:
+        """
+        Time- and money-weighted returns (see Account.returns) of each account, fund or investment type,
+        and of the whole portfolio ('Total'), between start and end (default: first and last status line
+        of any account).  Accounts are valued at every status date of any account, carrying each
+        account's latest status forward; an account or fund first appearing within the window counts as
+        money invested (see Account._holdings_and_flows).
+        """
+        grid = _window([acc._statusarrays()[0] for acc in self.accounts], start, end)
+        accValues, accFlows = {}, {}
+        for acc in self.accounts:
+            accValues[id(acc)], accFlows[id(acc)] = acc._holdings_and_flows(grid)
+        values, labels = self._gather(grid, lambda acc: accValues[id(acc)], by)
+        flows, _ = self._gather(grid, lambda acc: accFlows[id(acc)], by)
+        # the whole portfolio counts every account once, whatever by is
+        total = sum(v.sum(axis=1) for v in accValues.values())
+        totalFlows = sum(f.sum(axis=1) for f in accFlows.values())
+        values = np.column_stack([values, total])
+        flows = np.column_stack([flows, totalFlows])
+        return _returns(values, flows, grid, labels + ['Total'], annualize)
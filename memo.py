@@ -0,0 +1,46 @@
+"""
+Per-instance memoization of derived schedules, invalidated automatically when inputs change.
+
+Classes mix in Versioned, which counts assignments to their public attributes.  An object's state is its own
+count together with the states of every Versioned object it holds (e.g. a House's Mortgage and Rates), so
+changing house.price, house.down or house.mortgage.rate all make the cached results of that House stale.
+"""
+import numpy as np
+
+
+class Versioned:
+    _version = 0
+
+    def __setattr__(self, name, value):
+        super().__setattr__(name, value)
+        if not name.startswith('_'):
+            super().__setattr__('_version', self._version + 1)
+
+    def _state(self) -> tuple:
+        """
+        Hashable summary that changes whenever this object, or any Versioned object it holds, is modified.
+        """
+        return (self._version,) + tuple((name, value._state()) for name, value in vars(self).items()
+                                        if isinstance(value, Versioned))
+
+
+def memoize(func):
+    """
+    Decorator caching a method's result on the instance, keyed by its arguments, until the instance's
+    _state() changes.  Cached arrays are made read-only, since every caller receives the same array.
+    """
+    def newFunc(obj, *args):
+        state = obj._state()
+        cache = obj.__dict__.get('_cache')
+        if cache is None or cache['state'] != state:
+            # assign a fresh dict rather than clearing: shallow copies may still share the old one
+            cache = {'state': state}
+            obj._cache = cache
+        key = (func,) + args     # the function itself: wrapped methods all share the name newFunc
+        if key not in cache:
+            result = func(obj, *args)
+            if isinstance(result, np.ndarray):
+                result.flags.writeable = False
+            cache[key] = result
+        return cache[key]
+    return newFunc
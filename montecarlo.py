@@ -0,0 +1,119 @@
+"""
+Monte Carlo comparison of a House against a Rent.
+
+Instead of rerolling the class-wide Abode paths and calling pandaize() once per scenario, draw all
+market and inflation paths up front as (nPaths, nYears) matrices and evaluate every scenario in one pass.
+The House and Rent passed in are not modified; the paths are attached to shallow copies.
+
+Scenarios are split into fixed-size batches, each drawing from its own child Generator spawned from the
+run's seed.  Because the batches (not the workers) own the random streams, a given seed and batchSize
+produce the same scenarios however the batches are later scheduled.
+"""
+import copy
+import numpy as np
+import pandas as pd
+import logging
+from abode import Abode
+from rate import spawn
+from scenario import ScenarioGenerator
+from house import House
+from rent import Rent
+
+log = logging.Logger(__name__, level=logging.DEBUG)
+if not log.handlers:
+    log.addHandler(logging.StreamHandler())
+
+
+PERCENTILES = (10, 50, 90)
+BATCH_SIZE = 10000
+RESULTS = ('NetLoss', 'OOP_Invest', 'Proceeds', 'Rent_OOP_Invest')    # keys returned by evaluate()
+
+
+def defaultGenerator(house: House) -> ScenarioGenerator:
+    """
+    Independent market, inflation and appreciation draws, as used by House.pandaize.
+    """
+    return ScenarioGenerator({'market': Abode.MARKET,
+                              'inflation': Abode.INFLATION,
+                              'appreciation': house.appreciation})
+
+
+def attachPaths(abode: Abode, paths: dict, rng=None) -> Abode:
+    """
+    Return a shallow copy of abode evaluating the given (batched) paths, as returned by
+    ScenarioGenerator.generate.  A House also takes the 'appreciation' path and the 'mortgage' path
+    (prevailing mortgage rates, used by a VariableMortgage), if there are any.
+    """
+    batched = copy.copy(abode)
+    if isinstance(batched, House):
+        batched.setPaths(paths['market'], paths['inflation'], rng,
+                         paths.get('appreciation'), paths.get('mortgage'))
+    else:
+        batched.setPaths(paths['market'], paths['inflation'], rng)
+    return batched
+
+
+def batchSizes(nPaths: int, batchSize: int = BATCH_SIZE) -> list:
+    """
+    Split nPaths scenarios into batches of at most batchSize.
+    """
+    nFull, remainder = divmod(nPaths, batchSize)
+    return [batchSize] * nFull + ([remainder] if remainder else [])
+
+
+def evaluate(house: House, rent: Rent, nPaths: int, rng=None, generator: ScenarioGenerator = None) -> dict:
+    """
+    Evaluate nPaths scenarios of house and rent, sharing the same market and inflation paths.
+    Paths come from generator (by default, see defaultGenerator) and all draws from rng
+    (a seed or np.random.Generator).
+    Returns a dict of (nPaths, nYears+1) arrays, one row per scenario.
+    """
+    rng = np.random.default_rng(rng)
+    generator = generator if generator else defaultGenerator(house)
+    paths = generator.generate(house.nYears, nPaths, rng)
+    return evaluatePaths(house, rent, paths, rng)
+
+
+def evaluatePaths(house: House, rent: Rent, paths: dict, rng=None) -> dict:
+    """
+    As evaluate, on given (nPaths, nYears) paths, as returned by ScenarioGenerator.generate.
+    """
+    h = attachPaths(house, paths, rng)
+    r = attachPaths(rent, paths, rng)
+
+    proceeds = h.proceeds()
+    oopInvested = h.oopInvested()
+    return {'NetLoss': oopInvested - proceeds,
+            'OOP_Invest': oopInvested,
+            'Proceeds': proceeds,
+            'Rent_OOP_Invest': r.oopInvested(),
+            }
+
+
+def simulate(house: House, rent: Rent, nPaths: int, percentiles=PERCENTILES,
+             seed=None, batchSize: int = BATCH_SIZE, generator: ScenarioGenerator = None) -> pd.DataFrame:
+    """
+    Run nPaths Monte Carlo scenarios of house against rent and summarize them.
+    Return a DataFrame indexed by year whose columns are (quantity, percentile), e.g.
+    df['NetLoss'][50] is the median net loss of buying, year by year.
+    Pass seed (int, SeedSequence or Generator) for a reproducible run, and a ScenarioGenerator
+    for correlated or autocorrelated paths.
+    """
+    sizes = batchSizes(nPaths, batchSize)
+    batches = [evaluate(house, rent, n, rng, generator) for n, rng in zip(sizes, spawn(seed, len(sizes)))]
+    results = {name: np.concatenate([b[name] for b in batches]) for name in batches[0]}
+    return summarize(results, percentiles)
+
+
+def summarize(results: dict, percentiles=PERCENTILES) -> pd.DataFrame:
+    """
+    Collapse a dict of (nPaths, nYears+1) arrays into percentile bands per year.
+    """
+    data = {}
+    for name, array in results.items():
+        bands = np.percentile(array, percentiles, axis=0)
+        for p, band in zip(percentiles, bands):
+            data[(name, p)] = band.round()
+    df = pd.DataFrame(data=data)
+    df.index.name = 'Year'
+    return df
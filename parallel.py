@@ -0,0 +1,100 @@
+"""
+Run large House-vs-Rent Monte Carlo simulations across a pool of worker processes.
+
+Scenarios are split into the same fixed-size batches (and child random streams) as montecarlo.simulate,
+so a given seed and batchSize give identical percentiles whether run serially or on any number of workers.
+Workers write their batch directly into one block of shared memory holding every result array;
+nothing but the batch bounds and its Generator is pickled.
+run() is the underlying pool, also used by comparison.compare for its own batches.
+"""
+import os
+import time
+import itertools
+import numpy as np
+import pandas as pd
+import logging
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+from house import House
+from rent import Rent
+import montecarlo
+from rate import spawn
+from scenario import ScenarioGenerator
+
+log = logging.Logger(__name__, level=logging.INFO)
+if not log.handlers:
+    log.addHandler(logging.StreamHandler())
+
+
+# per-worker state, set once by _initWorker so that it is not re-sent with every task
+_worker = {}
+
+
+def _initWorker(state: dict):
+    _worker.update(state)
+
+
+def _call(function, *args):
+    return function(_worker, *args)
+
+
+def run(function, state: dict, *iterables, nWorkers: int = None) -> list:
+    """
+    Call function(state, *args) for every args in zip(*iterables) across a pool of worker processes, and
+    return the results in order.  state (e.g. the House and Rent) is sent once to each worker rather than
+    with every task; function must be defined at module level so that it can be pickled.
+    :param nWorkers: number of worker processes; defaults to the number of cores, 1 runs in this process
+    """
+    nWorkers = nWorkers if nWorkers else os.cpu_count()
+    if nWorkers == 1:
+        return [function(state, *args) for args in zip(*iterables)]
+    with ProcessPoolExecutor(max_workers=nWorkers, initializer=_initWorker, initargs=(state,)) as pool:
+        # list() re-raises the first exception from any worker
+        return list(pool.map(_call, itertools.repeat(function), *iterables))
+
+
+def _runBatch(state: dict, start: int, nPaths: int, rng):
+    """
+    Evaluate one batch and write it into rows start:start+nPaths of the shared result block.
+    """
+    batch = montecarlo.evaluate(state['house'], state['rent'], nPaths, rng, state['generator'])
+    shm = shared_memory.SharedMemory(name=state['shmName'])
+    try:
+        results = np.ndarray(state['shape'], dtype=np.float64, buffer=shm.buf)
+        for i, name in enumerate(montecarlo.RESULTS):
+            results[i, start:start + nPaths] = batch[name]
+        del results     # release the view before closing the shared block
+    finally:
+        shm.close()
+    return nPaths
+
+
+def simulate(house: House, rent: Rent, nPaths: int, percentiles=montecarlo.PERCENTILES,
+             seed=None, batchSize: int = montecarlo.BATCH_SIZE, nWorkers: int = None,
+             generator: ScenarioGenerator = None) -> pd.DataFrame:
+    """
+    Parallel counterpart of montecarlo.simulate, returning the same DataFrame of percentile bands.
+    :param nWorkers: number of worker processes; defaults to the number of cores
+    """
+    nWorkers = nWorkers if nWorkers else os.cpu_count()
+    sizes = montecarlo.batchSizes(nPaths, batchSize)
+    starts = np.concatenate([[0], np.cumsum(sizes)[:-1]])
+    rngs = spawn(seed, len(sizes))
+
+    shape = (len(montecarlo.RESULTS), nPaths, house.nYears + 1)
+    shm = shared_memory.SharedMemory(create=True, size=int(np.prod(shape)) * np.dtype(np.float64).itemsize)
+    try:
+        t0 = time.perf_counter()
+        state = {'house': house, 'rent': rent, 'generator': generator, 'shmName': shm.name, 'shape': shape}
+        run(_runBatch, state, starts, sizes, rngs, nWorkers=nWorkers)
+        elapsed = time.perf_counter() - t0
+        log.info("{0} scenarios on {1} workers in {2:.2f} s ({3:.0f} scenarios/s)".format(
+            nPaths, nWorkers, elapsed, nPaths / elapsed))
+
+        results = np.ndarray(shape, dtype=np.float64, buffer=shm.buf)
+        summary = montecarlo.summarize(dict(zip(montecarlo.RESULTS, results)), percentiles)
+        del results     # release the view before closing the shared block
+    finally:
+        shm.close()
+        shm.unlink()
+    return summary
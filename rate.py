@@ -4,45 +4,74 @@ Define the Rate class, a base class which can cover: interest rates, rate of ret
 Rates can be static (fixed), or a variance can be specified.
 
 Rates can generate returns over a fixed number of years.
+
+Random draws come from an explicit numpy Generator (see the seed argument of Rate), never from the
+global np.random state, so results can be reproduced.  Use spawn() to get independent child streams,
+e.g. one per batch of scenarios or per worker process.
 """
 import numpy as np
 import logging
+from memo import Versioned
 
 log = logging.Logger(__name__, level=logging.DEBUG)
 if not log.handlers:
     log.addHandler(logging.StreamHandler())
 
 
-class Rate:
-    def __init__(self, rate: float, variance: float = 0):
+class Rate(Versioned):
+    def __init__(self, rate: float, variance: float = 0, seed=None):
         """
         :param rate: enter as a percentage (e.g. "5" not "0.05")
         :param variance: optional  give the yearly variance (as percentage)
+        :param seed: optional  int, SeedSequence or np.random.Generator used for all draws
         """
         self.rate = rate
         self.variance = variance
+        self.rng = np.random.default_rng(seed)
 
-    def generate(self, n) -> np.array:
+    def generate(self, n, nPaths=None, rng=None) -> np.array:
         """
-        Return a numpy array of the rate over n time intervals (e.g. years)
+        Return a numpy array of the rate over n time intervals (e.g. years).
+        If nPaths is given, return an (nPaths, n) matrix holding nPaths independent draws.
+        Draws come from rng if given, otherwise from this Rate's own Generator.
         """
-        return np.random.normal(loc = self.rate/100,
-                                scale = self.variance/100,
-                                size = n)
+        rng = self.rng if rng is None else rng
+        size = n if nPaths is None else (nPaths, n)
+        return rng.normal(loc = self.rate/100,
+                          scale = self.variance/100,
+                          size = size)
 
-    def cumulative(self, nYears):
+    def cumulative(self, nYears, nPaths=None, rng=None):
         """
         Cascade the yearly returns (via generate() above) to get cumulative return each year.
         Returns an array that is nYears + 1 long, with the first entry being 1.0.
         In other words, the nth index is the accumulation after n years.
+        If nPaths is given, both returned arrays gain a leading axis of length nPaths,
+        e.g. the compounded array is (nPaths, nYears + 1).
         """
-        ratesYearly = self.generate(nYears)
+        ratesYearly = self.generate(nYears, nPaths, rng)
+        return ratesYearly, compound(ratesYearly)
+
+
+def spawn(seed, n) -> list:
+    """
+    Return n statistically independent np.random.Generators derived from seed.
+    The same seed always yields the same children, in the same order, regardless of how
+    they are later distributed across workers.
+    """
+    if isinstance(seed, np.random.Generator):
+        return seed.spawn(n)
+    if not isinstance(seed, np.random.SeedSequence):
+        seed = np.random.SeedSequence(seed)
+    return [np.random.default_rng(child) for child in seed.spawn(n)]
 
-        cumu = np.insert(ratesYearly.copy(),    # copy rate array
-                         0,                     # insert at 0th index
-                         1.0)                   # insert 1.0
 
-        for n in range(1, len(cumu)):
-            cumu[n] += 1.0
-            cumu[n] *= cumu[n-1]
-        return ratesYearly, cumu
+def compound(ratesYearly) -> np.array:
+    """
+    Compound an array of yearly rates (as decimals) along its last axis.
+    Returns an array one longer than ratesYearly along that axis, with the 0th entry being 1.0.
+    """
+    cumu = np.ones(ratesYearly.shape[:-1] + (ratesYearly.shape[-1] + 1,))
+    # compound along the year axis in one pass; index 0 stays at 1.0
+    np.cumprod(1.0 + ratesYearly, axis=-1, out=cumu[..., 1:])
+    return cumu
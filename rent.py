@@ -3,7 +3,7 @@ import pandas as pd
 import logging
 from rate import Rate
 from abode import Abode
-from abode import round
+from memo import memoize
 
 log = logging.Logger(__name__, level=logging.DEBUG)
 if not log.handlers:
@@ -11,33 +11,41 @@ if not log.handlers:
 
 
 class Rent(Abode):
-    def __init__(self, rentMonthly):
+    def __init__(self, rentMonthly, nYears=30):
         self.rentMonthly = rentMonthly
-        self.rentYearly = rentMonthly * 12
+        self.nYears = nYears                # horizon of the market and inflation paths
 
-    @round
+    @property
+    def rentYearly(self):
+        return self.rentMonthly * 12
+
+    @memoize
     def rentPrices(self):
-        return self.rentYearly * self.inflationCompounded[:-1]
+        return self.rentYearly * self.inflationCompounded[..., :-1]
 
-    @round
-    def oop(self, nYears=30):
+    @memoize
+    def oop(self):
         """
         Array of out-of-pocket expenses for each years.
         Length = nYears + 1, the 0th index being upfront expenses (typically 0 for renting)
         """
-        oop = np.zeros(nYears+1)
-        oop[1:] = self.rentPrices()
+        rentPrices = self.rentPrices()
+        oop = np.zeros(rentPrices.shape[:-1] + (rentPrices.shape[-1]+1,))
+        oop[..., 1:] = rentPrices
         return oop
 
     def pandaize(self) -> pd.DataFrame:
         data = {}
         data['Market'] = np.insert(self.marketReturnYearly, 0, np.nan).round(3) * 100
         data['Inflation'] = np.insert(self.inflationYearly, 0, np.nan).round(3) * 100
-        data['Rent'] = self.rentPrices()
+        data['Rent'] = np.insert(self.rentPrices(), 0, 0)   # no rent is paid at year 0
         data['OOP'] = self.oop()
         data['OppCostR'] = self.opportunityCostRealized()
         data['OOP_Invest'] = self.oopInvested()
         df = pd.DataFrame(data=data)
+        # everything is computed at full precision; round dollar amounts for display only
+        dollars = df.columns.drop(['Market', 'Inflation'])
+        df[dollars] = df[dollars].round()
         return df
 
     def writeCsv(self, filename=None):
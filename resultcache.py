@@ -0,0 +1,161 @@
+"""
+Persistent, content-addressed cache of simulation results.
+
+A run of montecarlo.evaluate over nPaths scenarios is fully determined by the parameters of the House, Rent,
+Mortgage, Rates and scenario generator, the seed, the batch size and the code of the model itself.  A hash of
+all of these names an entry on disk, stored in the export format (memory-mapped .npy arrays plus metadata.json),
+so a repeated run just maps the arrays back in.  Summaries (percentile bands) are cached inside the entry too.
+
+Entries are written to a temporary directory and renamed into place, so parallel workers can share a cache: a
+reader never sees a half-written entry, and if two workers compute the same entry the second copy is dropped.
+When the cache grows beyond maxBytes, the least recently used entries are deleted.
+"""
+import os
+import sys
+import json
+import hashlib
+import shutil
+import tempfile
+import numpy as np
+import pandas as pd
+import logging
+from house import House
+from rent import Rent
+from scenario import ScenarioGenerator
+import montecarlo
+import export
+
+log = logging.Logger(__name__, level=logging.DEBUG)
+if not log.handlers:
+    log.addHandler(logging.StreamHandler())
+
+
+CACHE_DIR = os.path.join(os.path.expanduser('~'), '.cache', 'finance')
+MAX_BYTES = 2 * 10**9
+# modules whose source determines simulation results; editing any of them invalidates every entry
+MODEL_MODULES = ('rate', 'memo', 'abode', 'house', 'rent', 'scenario', 'montecarlo')
+
+
+def codeVersion() -> str:
+    """
+    Hash of the source of the model modules.
+    """
+    digest = hashlib.sha256()
+    for name in MODEL_MODULES:
+        with open(sys.modules[name].__file__, mode='rb') as file:
+            digest.update(file.read())
+    return digest.hexdigest()
+
+
+class ResultCache:
+    def __init__(self, directory: str = CACHE_DIR, maxBytes: int = MAX_BYTES):
+        self.directory = directory
+        self.maxBytes = maxBytes
+        self.version = codeVersion()
+        os.makedirs(directory, exist_ok=True)
+
+    def key(self, house: House, rent: Rent, nPaths: int, seed: int, batchSize: int,
+            generator: ScenarioGenerator) -> str:
+        parameters = {'house': export.describe(house),
+                      'rent': export.describe(rent),
+                      'generator': export.describe(generator),
+                      'nPaths': nPaths,
+                      'seed': seed,
+                      'batchSize': batchSize,
+                      'code': self.version,
+                      }
+        return hashlib.sha256(json.dumps(parameters, sort_keys=True).encode()).hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key)
+
+    def get(self, key: str):
+        """
+        Return the cached results (dict of memory-mapped arrays) for key, or None.
+        """
+        path = self._path(key)
+        try:
+            _, results = export.load(path)
+            os.utime(os.path.join(path, export.METADATA))     # mark as recently used
+        except FileNotFoundError:       # never written, or evicted by another process meanwhile
+            return None
+        return results
+
+    def evaluate(self, house: House, rent: Rent, nPaths: int, seed: int,
+                 batchSize: int = montecarlo.BATCH_SIZE, generator: ScenarioGenerator = None) -> tuple:
+        """
+        Results of montecarlo.simulate's scenarios (NetLoss, OOP_Invest, ...), from the cache if possible.
+        seed must be an int: unseeded runs cannot be reproduced, so are never cached.
+        Returns (key, results).
+        """
+        if not isinstance(seed, (int, np.integer)):
+            raise ValueError("ResultCache: seed must be an int to cache results; got {0}".format(type(seed)))
+        generator = generator if generator else montecarlo.defaultGenerator(house)
+        key = self.key(house, rent, nPaths, int(seed), batchSize, generator)
+        results = self.get(key)
+        if results is None:
+            temporary = tempfile.mkdtemp(prefix='.tmp-', dir=self.directory)
+            export.export(house, rent, nPaths, temporary, int(seed), batchSize, generator, dtype=np.float64)
+            # map the arrays before renaming: the maps stay valid even if the entry is later evicted
+            _, results = export.load(temporary)
+            try:
+                os.rename(temporary, self._path(key))
+            except OSError:             # another worker stored the same entry first
+                results = self.get(key) or results
+                shutil.rmtree(temporary, ignore_errors=True)
+            self.evict(keep=key)
+        return key, results
+
+    def simulate(self, house: House, rent: Rent, nPaths: int, seed: int, percentiles=montecarlo.PERCENTILES,
+                 batchSize: int = montecarlo.BATCH_SIZE, generator: ScenarioGenerator = None) -> pd.DataFrame:
+        """
+        Cached counterpart of montecarlo.simulate, returning the same DataFrame of percentile bands.
+        """
+        key, results = self.evaluate(house, rent, nPaths, seed, batchSize, generator)
+        summaryFile = os.path.join(self._path(key), 'summary-' + '-'.join(str(p) for p in percentiles) + '.pkl')
+        try:
+            return pd.read_pickle(summaryFile)
+        except FileNotFoundError:
+            summary = montecarlo.summarize(results, percentiles)
+            temporary = summaryFile + '.' + str(os.getpid())
+            try:
+                summary.to_pickle(temporary)
+                os.replace(temporary, summaryFile)
+            except OSError:             # entry evicted meanwhile; the summary is still valid
+                pass
+            return summary
+
+    def entries(self) -> list:
+        """
+        (last used, size in bytes, path) of every complete entry.
+        """
+        entries = []
+        for name in os.listdir(self.directory):
+            if name.startswith('.tmp-'):
+                continue
+            path = self._path(name)
+            try:
+                used = os.path.getmtime(os.path.join(path, export.METADATA))
+                size = sum(os.path.getsize(os.path.join(path, f)) for f in os.listdir(path))
+            except FileNotFoundError:   # being evicted by another process
+                continue
+            entries.append((used, size, path))
+        return entries
+
+    def evict(self, keep: str = None):
+        """
+        Delete least recently used entries until the cache fits within maxBytes, sparing the entry keep.
+        """
+        entries = sorted(self.entries())
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in entries:
+            if total <= self.maxBytes:
+                break
+            if keep is not None and path == self._path(keep):
+                continue
+            shutil.rmtree(path, ignore_errors=True)
+            total -= size
+
+    def clear(self):
+        for _, _, path in self.entries():
+            shutil.rmtree(path, ignore_errors=True)
@@ -0,0 +1,108 @@
+"""
+Generate correlated, autocorrelated yearly rate paths (market, inflation, appreciation, ...) in bulk.
+
+Each factor is described by a Rate (mean and yearly variance, as percentages).  On top of independent normal
+draws, a ScenarioGenerator can add:
+- correlation between factors within a year (e.g. high inflation together with bad markets),
+- AR(1) autocorrelation of each factor from year to year, keeping the Rate's variance as the stationary one,
+- Markov regime switching, each regime shifting the mean of every factor.
+All paths are produced with whole-array operations: the AR(1) recursion is applied as one matrix product
+with a lower-triangular decay matrix, and only the regime chain steps through the years.
+"""
+import numpy as np
+import logging
+
+log = logging.Logger(__name__, level=logging.DEBUG)
+if not log.handlers:
+    log.addHandler(logging.StreamHandler())
+
+
+class ScenarioGenerator:
+    def __init__(self,
+                 rates: dict,                   # factor name -> Rate, e.g. {'market': Abode.MARKET, ...}
+                 correlation=None,              # factor-by-factor correlation matrix of the yearly shocks
+                 autocorrelation=0.,            # AR(1) coefficient, one for all factors or one per factor
+                 transition=None,               # regime-by-regime Markov transition matrix (rows sum to 1)
+                 regimeShifts=None              # regime-by-factor shift of the mean rate (as percentage)
+                 ):
+        self.names = list(rates)
+        self.rates = [rates[name] for name in self.names]
+        nFactors = len(self.names)
+
+        self.correlation = None if correlation is None else np.asarray(correlation, dtype=float)
+        if self.correlation is not None and self.correlation.shape != (nFactors, nFactors):
+            raise ValueError("ScenarioGenerator: correlation must be {0}x{0}; got {1}".format(
+                nFactors, self.correlation.shape))
+
+        self.autocorrelation = np.broadcast_to(np.asarray(autocorrelation, dtype=float), (nFactors,))
+        if np.any(np.abs(self.autocorrelation) >= 1):
+            raise ValueError("ScenarioGenerator: autocorrelation must be between -1 and 1")
+
+        if (transition is None) != (regimeShifts is None):
+            raise ValueError("ScenarioGenerator: transition and regimeShifts must be given together")
+        self.transition = None if transition is None else np.asarray(transition, dtype=float)
+        self.regimeShifts = None if regimeShifts is None else np.asarray(regimeShifts, dtype=float)
+        if self.transition is not None:
+            if not np.allclose(self.transition.sum(axis=1), 1):
+                raise ValueError("ScenarioGenerator: rows of transition must sum to 1")
+            if self.regimeShifts.shape != (len(self.transition), nFactors):
+                raise ValueError("ScenarioGenerator: regimeShifts must be {0}x{1}; got {2}".format(
+                    len(self.transition), nFactors, self.regimeShifts.shape))
+
+    def _shocks(self, nYears, nPaths, rng) -> np.array:
+        """
+        (nFactors, nPaths, nYears) standard normal shocks, correlated across factors.
+        """
+        nFactors = len(self.names)
+        z = rng.standard_normal((nFactors, nPaths, nYears))
+        if self.correlation is not None:
+            # one (nFactors x nFactors) @ (nFactors x everything) product mixes the factors
+            z = (np.linalg.cholesky(self.correlation) @ z.reshape(nFactors, -1)).reshape(z.shape)
+        return z
+
+    def _regimes(self, nYears, nPaths, rng) -> np.array:
+        """
+        (nPaths, nYears) regime index of every year, every path starting in regime 0.
+        """
+        thresholds = self.transition.cumsum(axis=1)
+        uniform = rng.random((nYears, nPaths))
+        regimes = np.zeros((nYears, nPaths), dtype=np.intp)
+        for year in range(1, nYears):
+            # next regime is the number of cumulative transition probabilities the draw exceeds
+            state = regimes[year - 1]
+            for k in range(len(thresholds) - 1):
+                regimes[year] += uniform[year] > thresholds[state, k]
+        return regimes.T
+
+    def generate(self, nYears, nPaths=None, rng=None) -> dict:
+        """
+        Return a dict, factor name -> yearly rates (as decimals), of shape (nPaths, nYears),
+        or (nYears,) if nPaths is None.  Draws come from rng (a seed or np.random.Generator).
+        """
+        rng = np.random.default_rng(rng)
+        n = 1 if nPaths is None else nPaths
+        mean = np.array([r.rate for r in self.rates]) / 100
+        sigma = np.array([r.variance for r in self.rates]) / 100
+        phi = self.autocorrelation
+
+        shocks = self._shocks(nYears, n, rng)
+        # scale innovations so each factor's stationary standard deviation is its Rate's variance
+        shocks[:, :, 1:] *= (sigma * np.sqrt(1 - phi**2))[:, None, None]
+        shocks[:, :, :1] *= sigma[:, None, None]
+        if np.any(phi != 0):
+            # x[t] = phi * x[t-1] + e[t]  <=>  x = e @ D.T with D[t, k] = phi**(t-k) for k <= t
+            years = np.arange(nYears)
+            lag = years[:, None] - years[None, :]
+            decay = np.where(lag >= 0, phi[:, None, None] ** np.maximum(lag, 0), 0.)
+            shocks = shocks @ decay.transpose(0, 2, 1)
+        rates = mean[:, None, None] + shocks
+
+        if self.transition is not None:
+            regimes = self._regimes(nYears, n, rng)
+            for f, shifts in enumerate(self.regimeShifts.T / 100):
+                rates[f] += shifts[regimes]
+
+        if nPaths is None:
+            rates = rates[:, 0]
+        return dict(zip(self.names, rates))
+
@@ -0,0 +1,114 @@
+"""
+Global (Sobol) sensitivity of House outcomes to its inputs.
+
+Which uncertain inputs -- appreciation, market return, mortgage rate, upkeep, closing costs, PMI rate, ... --
+drive the spread in a House's final NetLoss (or, given a Rent, in the advantage of renting over buying)?
+Inputs are drawn uniformly within given bounds using Saltelli's scheme: two sample matrices A and B, plus,
+for every input i, the matrix A with column i taken from B.  All k+2 matrices are stacked and evaluated as one
+batched House (inputs as column vectors, see sweep), so a full analysis costs a single vectorized evaluation
+instead of one House per sample.  First-order indices use Saltelli's (2010) estimator and total indices Jansen's;
+confidence intervals come from bootstrapping the sample rows.
+
+Market return and appreciation are treated as uncertain yearly means: every sample follows a constant path.
+"""
+import copy
+import numpy as np
+import pandas as pd
+import logging
+from house import House
+from rent import Rent
+from rate import Rate
+import montecarlo
+
+log = logging.Logger(__name__, level=logging.DEBUG)
+if not log.handlers:
+    log.addHandler(logging.StreamHandler())
+
+
+# inputs that can be varied; bounds are in the same units as the House attribute (percentages, dollars)
+INPUTS = ('market', 'inflation', 'appreciation', 'rate', 'upkeep', 'insurance', 'tax', 'down',
+          'closingCostBuy', 'closingCostSell', 'pmi_rate')
+ATTRIBUTES = ('upkeep', 'insurance', 'tax', 'down', 'closingCostBuy', 'closingCostSell')
+N_BOOTSTRAP = 200
+
+
+def outcome(house: House, samples: dict, rent: Rent = None, year: int = None) -> np.array:
+    """
+    Evaluate house once for every row of samples (input name -> 1-d array, all of the same length).
+    Returns the buyer's NetLoss in year (default: the end of the mortgage), or, if rent is given,
+    the renter's OOP_Invest minus the buyer's NetLoss.
+    """
+    nSamples = len(next(iter(samples.values())))
+    nYears = house.nYears
+    year = nYears if year is None else year
+
+    def path(name, default: Rate):
+        rate = samples[name] if name in samples else np.full(nSamples, default.rate)
+        return np.repeat(rate[:, None] / 100, nYears, axis=1)
+
+    paths = {'market': path('market', house.MARKET),
+             'inflation': path('inflation', house.INFLATION),
+             'appreciation': path('appreciation', house.appreciation),
+             }
+    h = copy.copy(house)
+    for name in ATTRIBUTES:
+        if name in samples:
+            setattr(h, name, samples[name][:, None])
+    if 'rate' in samples:
+        h.mortgage = house.mortgage.withRate(samples['rate'][:, None])
+    if 'pmi_rate' in samples:
+        h.pmi_rate = Rate(samples['pmi_rate'][:, None])
+    h = montecarlo.attachPaths(h, paths)
+    netLoss = h.oopInvested() - h.proceeds()
+    if rent is None:
+        return netLoss[:, year]
+    r = montecarlo.attachPaths(rent, paths)
+    return r.oopInvested()[:, year] - netLoss[:, year]
+
+
+def _indices(fA, fB, fAB) -> tuple:
+    """
+    First-order and total Sobol indices from model outputs fA, fB (..., N) and fAB (..., k, N).
+    """
+    variance = np.concatenate([fA, fB], axis=-1).var(axis=-1)[..., None]
+    first = (fB[..., None, :] * (fAB - fA[..., None, :])).mean(axis=-1) / variance
+    total = 0.5 * ((fA[..., None, :] - fAB) ** 2).mean(axis=-1) / variance
+    return first, total
+
+
+def sobol(house: House, bounds: dict, nSamples: int = 10000, rent: Rent = None, year: int = None,
+          seed=None, nBootstrap: int = N_BOOTSTRAP) -> pd.DataFrame:
+    """
+    Sobol indices of each input in bounds (input name -> (low, high)), estimated from nSamples base rows.
+    Returns a DataFrame indexed by input with first-order (S1) and total (ST) indices, each with the
+    half-width of its 95% bootstrap confidence interval (S1_conf, ST_conf).
+    """
+    for name in bounds:
+        if name not in INPUTS:
+            raise ValueError("sobol: input must be one of {0}; got {1}".format(INPUTS, name))
+    names = list(bounds)
+    k = len(names)
+    low = np.array([bounds[name][0] for name in names], dtype=float)
+    high = np.array([bounds[name][1] for name in names], dtype=float)
+
+    rng = np.random.default_rng(seed)
+    A = low + (high - low) * rng.random((nSamples, k))
+    B = low + (high - low) * rng.random((nSamples, k))
+    AB = np.repeat(A[None], k, axis=0)          # AB[i] is A with column i from B
+    AB[np.arange(k), :, np.arange(k)] = B.T
+
+    # one evaluation over every sample matrix, stacked as [A, B, AB_0, ..., AB_k-1]
+    stacked = np.concatenate([A, B, AB.reshape(k * nSamples, k)])
+    f = outcome(house, {name: stacked[:, i] for i, name in enumerate(names)}, rent, year)
+    fA, fB, fAB = f[:nSamples], f[nSamples:2 * nSamples], f[2 * nSamples:].reshape(k, nSamples)
+
+    first, total = _indices(fA, fB, fAB)
+    # bootstrap: resample rows (the same rows for every matrix) nBootstrap times, all at once
+    rows = rng.integers(nSamples, size=(nBootstrap, nSamples))
+    firstBoot, totalBoot = _indices(fA[rows], fB[rows], fAB[:, rows].transpose(1, 0, 2))
+    df = pd.DataFrame({'S1': first,
+                       'S1_conf': 1.96 * firstBoot.std(axis=0),
+                       'ST': total,
+                       'ST_conf': 1.96 * totalBoot.std(axis=0),
+                       }, index=pd.Index(names, name='input'))
+    return df
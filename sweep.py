@@ -0,0 +1,69 @@
+"""
+Sweep House inputs over a cartesian grid, evaluating the whole grid as one array computation.
+
+Every swept input is reshaped to lie along its own axis, with a trailing axis of length one for the years,
+and handed to a single House.  The House methods then broadcast to one schedule per grid point.
+Only the mortgage duration changes the length of the year axis, so the grid is evaluated once per duration.
+"""
+import numpy as np
+import pandas as pd
+import logging
+from house import House
+from house import Mortgage
+
+log = logging.Logger(__name__, level=logging.DEBUG)
+if not log.handlers:
+    log.addHandler(logging.StreamHandler())
+
+
+# grid dimensions, in the order of the axes of the array returned by grid()
+DIMENSIONS = ('price', 'down', 'rate', 'duration', 'upkeep', 'tax', 'closingCostBuy', 'closingCostSell')
+
+
+def _along(values, axis: int, ndim: int) -> np.array:
+    """
+    Reshape 1-d values to lie along axis of an ndim-dimensional grid, plus a trailing year axis.
+    """
+    shape = [1] * (ndim + 1)
+    shape[axis] = -1
+    return np.asarray(values, dtype=float).reshape(shape)
+
+
+def grid(price, down, rate, duration, upkeep=(1.,), tax=(0.,), closingCostBuy=(5.,), closingCostSell=(6.,),
+         **kwargs) -> np.array:
+    """
+    Return the final NetLoss (out-of-pocket expenses plus opportunity cost, minus sale proceeds, when the
+    house is sold at the end of the mortgage) for every combination of the given input values.
+    Each argument is a sequence of values; the result has one axis per argument, in the order of DIMENSIONS.
+    Remaining keyword arguments (e.g. insurance, rollClosingCost) are passed to House unchanged.
+    """
+    values = dict(price=price, down=down, rate=rate, duration=duration, upkeep=upkeep, tax=tax,
+                  closingCostBuy=closingCostBuy, closingCostSell=closingCostSell)
+    ndim = len(DIMENSIONS)
+    axes = {name: _along(values[name], i, ndim) for i, name in enumerate(DIMENSIONS)}
+
+    finals = []
+    for years in duration:
+        house = House(axes['price'],
+                      Mortgage(axes['rate'], int(years)),
+                      tax=axes['tax'],
+                      upkeep=axes['upkeep'],
+                      down=axes['down'],
+                      closingCostBuy=axes['closingCostBuy'],
+                      closingCostSell=axes['closingCostSell'],
+                      **kwargs)
+        netLoss = house.oopInvested() - house.proceeds()
+        # the duration axis has length one within this evaluation; the final year is the sale
+        finals.append(netLoss[..., -1])
+    return np.concatenate(finals, axis=DIMENSIONS.index('duration'))
+
+
+def sweep(price, down, rate, duration, upkeep=(1.,), tax=(0.,), closingCostBuy=(5.,), closingCostSell=(6.,),
+          **kwargs) -> pd.DataFrame:
+    """
+    Tidy version of grid(): one row per combination of inputs, with the final NetLoss as the last column.
+    """
+    cube = grid(price, down, rate, duration, upkeep, tax, closingCostBuy, closingCostSell, **kwargs)
+    values = [price, down, rate, duration, upkeep, tax, closingCostBuy, closingCostSell]
+    index = pd.MultiIndex.from_product(values, names=DIMENSIONS)
+    return pd.DataFrame({'NetLoss': cube.ravel()}, index=index).reset_index()
@@ -0,0 +1,58 @@
+import numpy as np
+import house
+
+
+def test_rate_change_after_evaluation():
+    m = house.Mortgage(3., 30)
+    m.calculate_principle()
+    m.rate = 6
+    assert np.isclose(m.payment, house.Mortgage(6., 30).payment)
+    assert np.allclose(m.calculate_principle(), house.Mortgage(6., 30).calculate_principle())
+
+
+def test_house_rate_change_after_evaluation():
+    h = house.exampleCA()
+    h.pandaize()
+    h.mortgage.rate = 6
+    expected = house.House(700000, house.Mortgage(6., 30), tax=5500, down=20)
+    assert np.allclose(h.mortgagePayments(), expected.mortgagePayments())
+
+
+def test_with_rate_does_not_reuse_cache():
+    m = house.Mortgage(3., 30)
+    m.calculate_payments()
+    varied = m.withRate(6.)
+    assert np.allclose(varied.calculate_payments(), house.Mortgage(6., 30).calculate_payments())
+    assert np.allclose(m.calculate_payments(), house.Mortgage(3., 30).calculate_payments())
+
+
+def test_adjustable_reset_at_origination_keeps_initial_rate():
+    m = house.AdjustableMortgage(4., 30, margin=2., fixedYears=0)
+    m.marketRates = np.linspace(1., 3., 30)
+    rates, _ = m.effectiveRates()
+    assert rates[0] == 4.
+    assert rates[1] == 3.
+
+
+def test_variable_mortgage_floats_with_prevailing_rate():
+    fixed = house.House(700000, house.Mortgage(5., 30), tax=5500)
+    floating = house.House(700000, house.VariableMortgage(5., 30), tax=5500)
+    assert np.allclose(floating.pandaize()['NetLoss'], fixed.pandaize()['NetLoss'])
+
+
+def test_refinance_without_closing_cost_is_reported():
+    m = house.RefinanceMortgage(5., 30, closingCost=0, year=5)
+    m.marketRates = np.full(30, 3.)
+    rates, _ = m.effectiveRates()
+    assert rates[4] == 5. and rates[5] == 3.
+    refinanced = m.refinanced()
+    # by the end of year 5, i.e. index 5 (0th index: at purchase)
+    assert not refinanced[:5].any() and refinanced[5:].all()
+
+
+def test_amortize_grid_of_rates_and_durations():
+    rates = np.array([3., 6.])
+    durations = np.array([15, 30])
+    payment = house.amortize(rates[:, None, None], durations[None, :, None])['payment']
+    assert payment.shape[:2] == (2, 2)
+    assert np.isclose(payment[1, 0].max(), house.amortize(6., 15)['payment'])
@@ -0,0 +1,144 @@
+import datetime
+import numpy as np
+import pandas as pd
+import pytest
+
+pytest.importorskip('matplotlib')
+import allocation
+import investment
+import investment_types
+
+
+def account(name, funds, entries, rows):
+    """
+    Account holding funds, allocated as entries (list of (InvestmentType, percent, fundlist)), with ledger rows.
+    """
+    acc = investment.Account(data=pd.DataFrame(rows))
+    acc.name = name
+    acc.subname = ''
+    acc.funds = funds
+    acc.alloc = allocation.Allocation([allocation.AllocationEntry(*entry) for entry in entries])
+    return acc
+
+
+def status(date, **amounts):
+    return dict(type='status', date=datetime.date.fromisoformat(date), **amounts)
+
+
+def ledger():
+    """
+    Two accounts: A from 2020 with a transact in 2021 and fund a3 held only on the last date, and B from 2021,
+    which shares fund a1 with A but has left it blank.  The portfolio also targets RealEstate, held nowhere.
+    """
+    a = account('A', ['a1', 'a2', 'a3'],
+                [(investment_types.Stock(), 0.5, ['a1']), (investment_types.Bond(), 0.5, ['a2', 'a3'])],
+                [status('2020-01-01', a1=1000, a2=1000, a3=0),
+                 status('2021-01-01', a1=1100, a2=1000, a3=0),
+                 status('2022-01-01', a1=1760, a2=1000, a3=300)])
+    a.transact([500, 0, 0], '2021-07-01')
+    b = account('B', ['b1', 'a1'],
+                [(investment_types.Stock(), 1., ['b1', 'a1'])],
+                [status('2021-01-01', b1=2000, a1=np.nan),
+                 status('2022-01-01', b1=2200, a1=np.nan)])
+    alloc = allocation.Allocation([allocation.AllocationEntry(investment_types.Stock(), 0.6, []),
+                                   allocation.AllocationEntry(investment_types.Bond(), 0.3, []),
+                                   allocation.AllocationEntry(investment_types.RealEstate(), 0.1, [])])
+    return a, b, investment.Portfolio([a, b], alloc)
+
+
+def test_xirr():
+    days = np.array([0, 365, 730])
+    rates = investment.xirr(np.array([[-1000, 0, 1210], [-1000, -100, 1320], [0, 0, 0]]), days)
+    assert np.isclose(rates[0], 0.1)
+    # net present value of the second row is zero at its rate
+    assert np.isclose((np.array([-1000, -100, 1320]) / (1 + rates[1]) ** (days / 365)).sum(), 0, atol=1e-6)
+    # no cash flows: no rate, rather than the top of the bracket
+    assert np.isnan(rates[2])
+
+
+def test_account_returns():
+    a, _, _ = ledger()
+    returns = a.returns(annualize=False)
+    # a1 grows 10%, is unchanged over the half year of the transact, then grows 10%
+    assert np.isclose(returns.loc['a1', 'TWR'], 21.)
+    assert np.isclose(returns.loc['a2', 'TWR'], 0.)
+    # a3 is only held on the last date: invested, not earned
+    assert np.isclose(returns.loc['a3', 'TWR'], 0.)
+    assert np.isnan(returns.loc['a3', 'MWR'])
+    mwr = a.returns().loc['a1', 'MWR'] / 100
+    years = np.array([0, 547, 731]) / 365
+    assert np.isclose((np.array([-1000, -500, 1760]) / (1 + mwr) ** years).sum(), 0, atol=1e-6)
+
+
+def test_portfolio_returns_count_late_account_as_invested():
+    a, b, p = ledger()
+    returns = p.returns(by='account', annualize=False)
+    # B opens with 2000 a year into the window; the total grows 5% to mid-2021 and 4960/4600 after
+    assert np.isclose(returns.loc['Total', 'TWR'], (2100 / 2000 * 4960 / 4600 - 1) * 100)
+    assert np.isclose(returns.loc['B', 'TWR'], 10.)
+    assert np.isclose(p.returns(by='account').loc['B', 'MWR'], 10., atol=1e-6)
+    # RealEstate is held nowhere
+    byType = p.returns(by='type')
+    assert byType.loc['realEstate', 'TWR'] == 0.
+    assert np.isnan(byType.loc['realEstate', 'MWR'])
+
+
+def test_portfolio_skips_blank_fund_cell():
+    a, b, p = ledger()
+    # B's a1 cell is blank: it holds nothing, as in Account.total
+    assert np.isclose(p.total, a.total + b.total)
+    assert np.isclose(p.total, 1760 + 1000 + 300 + 2200)
+    assert np.allclose(p.service_allocations(), [1760 + 2200, 1300, 0])
+
+
+def test_service_allocations_match_accounts():
+    a, _, p = ledger()
+    p = investment.Portfolio([a], p.alloc)
+    expected = [a.service_investment_type(entry.itype) for entry in p.alloc]
+    assert np.allclose(p.service_allocations(), expected)
+    assert np.allclose(p.exposures()['A'], expected)
+
+
+def test_journal_commit_orders_by_date():
+    a, _, _ = ledger()
+    a.commit()
+    before = len(a)
+    a.transact([100, 0, 0], '2020-06-01')
+    a.append_dataframe(pd.DataFrame([status('2019-01-01', a1=900, a2=1000, a3=0)]))
+    # queued until commit
+    assert len(pd.DataFrame(a)) == before
+    a.commit()
+    assert len(a) == before + 3
+    dates = list(a['date'])
+    assert dates == sorted(dates)
+    # a transact comes before the status line it produces
+    june = a[a['date'] == datetime.date(2020, 6, 1)]
+    assert list(june['type']) == ['transact', 'status']
+
+
+def test_status_index_under_backdated_transact():
+    a, _, _ = ledger()
+    latest = a._laststatus()
+    a.transact([100, 0, 0], '2020-06-01')
+    # the backdated transact builds on the status line before it, and leaves the latest one alone
+    assert a._laststatus(datetime.date(2020, 6, 1))['a1'] == 1100
+    assert a._laststatus() is latest
+    assert a.total == 1760 + 1000 + 300
+    a.transact([0, 50, 0], '2023-01-01')
+    assert a._laststatus()['a2'] == 1050
+    assert a._laststatus(datetime.date(2022, 6, 1))['a2'] == 1000
+
+
+def test_holdings_asof_and_history():
+    a, _, p = ledger()
+    assert a.holdings_asof('2019-12-31').isna().all()
+    assert a.holdings_asof('2021-03-01').tolist() == [1100, 1000, 0]
+    # the transact's status line counts from its own date
+    assert a.holdings_asof('2021-07-01')['a1'] == 1600
+    history = a.history(freq='YE', start='2020-01-01', end='2022-12-31')
+    # year ends: before the transact, after it, and after the last status line
+    assert history['a1'].tolist() == [1000, 1600, 1760]
+    # B counts as empty before its first status line, and its blank a1 cell as nothing
+    assert p.asof('2020-06-01').tolist() == [2000, 0]
+    assert p.asof('2022-06-01', by='type').tolist() == [1760 + 2200, 1300, 0]
+    assert p.history(freq=None)['B'].tolist() == [0, 2000, 2000, 2200]